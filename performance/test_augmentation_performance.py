@@ -12,7 +12,7 @@ class TestTransform(TestCase):
         c = np.zeros([N], dtype=int)
         split_np = {'images': data, 'classes' :c}
 
-        split_no_transform = trw.train.SequenceArray(split_np)
+        split_no_transform = trw.train.SequenceArray(split_np, reuse_batch_buffers=True)
         transform = trw.transforms.TransformRandomCrop(padding=[0, 8, 8])
         split_with_transform = trw.train.SequenceArray(split_np, transforms=transform, sampler=trw.train.SamplerRandom(batch_size=500))
 
@@ -6,7 +6,7 @@ import numpy as np
 import torch
 
 
-def create_cifar10_dataset(batch_size=300, root=None, transform_train=None, transform_valid=None, nb_workers=2, data_processing_batch_size=None, normalize_0_1=True):
+def create_cifar10_dataset(batch_size=300, root=None, transform_train=None, transform_valid=None, nb_workers=2, data_processing_batch_size=None, normalize_0_1=True, pin_memory=False):
     if root is None:
         # first, check if we have some environment variables configured
         root = os.environ.get('TRW_DATA_ROOT')
@@ -15,10 +15,11 @@ def create_cifar10_dataset(batch_size=300, root=None, transform_train=None, tran
         # else default a standard folder
         root = './data'
 
-    if nb_workers > 0 and data_processing_batch_size is None:
-        data_processing_batch_size = batch_size // nb_workers
-    else:
-        data_processing_batch_size = batch_size
+    if data_processing_batch_size is None:
+        if nb_workers > 0:
+            data_processing_batch_size = batch_size // nb_workers
+        else:
+            data_processing_batch_size = batch_size
 
     cifar_path = os.path.join(root, 'cifar10')
 
@@ -46,10 +47,10 @@ def create_cifar10_dataset(batch_size=300, root=None, transform_train=None, tran
         return sequence
 
     splits = collections.OrderedDict()
-    splits['train'] = create_sequence(transform_train, ds).collate()
+    splits['train'] = create_sequence(transform_train, ds).collate(pin_memory=pin_memory)
 
     ds = {'images': convert_image(test_dataset), 'targets': np.asarray(test_dataset.targets, dtype=np.int64)}
-    splits['test'] = create_sequence(transform_valid, ds).collate()
+    splits['test'] = create_sequence(transform_valid, ds).collate(pin_memory=pin_memory)
     return {
         'cifar10': splits
     }
@@ -161,7 +161,8 @@ def create_fake_symbols_datasset(
         noise_fn=functools.partial(_noisy, noise_type='poisson'),
         max_classes=None,
         batch_size=64,
-        background=255):
+        background=255,
+        device=None):
     """
     Create artificial 2D for classification and segmentation problems
 
@@ -181,6 +182,8 @@ def create_fake_symbols_datasset(
         batch_size: the size of the batch for the dataset
         background: the background value of the sample (before normalization if `normalize_0_1` is `True`)
         dataset_name: the name of the returned dataset
+        device: if not `None`, the features are stored on this device. For example, a dataset fitting in
+            the GPU memory is then sampled directly on the GPU without any host to device copy
 
     Returns:
         a dict containing the dataset `fake_symbols_2d` with `train` and `valid` splits with features `image`,
@@ -241,6 +244,9 @@ def create_fake_symbols_datasset(
             feature_values = np.asarray(feature_values, dtype=np.int64)
         dataset_train[feature_name] = torch.from_numpy(np.asarray(feature_values[:nb_train]))
         dataset_valid[feature_name] = torch.from_numpy(np.asarray(feature_values[nb_train:]))
+        if device is not None:
+            dataset_train[feature_name] = dataset_train[feature_name].to(device)
+            dataset_valid[feature_name] = dataset_valid[feature_name].to(device)
 
     return {
         dataset_name: {
@@ -102,7 +102,8 @@ def create_fake_symbols_2d_dataset(
         max_classes=None,
         batch_size=64,
         background=255,
-        dataset_name='fake_symbols_2d'):
+        dataset_name='fake_symbols_2d',
+        device=None):
     """
     Create artificial 2D for classification and segmentation problems
 
@@ -122,6 +123,8 @@ def create_fake_symbols_2d_dataset(
         batch_size: the size of the batch for the dataset
         background: the background value of the sample (before normalization if `normalize_0_1` is `True`)
         dataset_name: the name of the returned dataset
+        device: if not `None`, the features are stored on this device. For example, a dataset fitting in
+            the GPU memory is then sampled directly on the GPU without any host to device copy
 
     Returns:
         a dict containing the dataset `fake_symbols_2d` with `train` and `valid` splits with features `image`,
@@ -140,5 +143,6 @@ def create_fake_symbols_2d_dataset(
         max_classes=max_classes,
         batch_size=batch_size,
         background=background,
-        dataset_name=dataset_name
+        dataset_name=dataset_name,
+        device=device
     )
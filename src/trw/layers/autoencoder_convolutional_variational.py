@@ -119,6 +119,41 @@ class AutoencoderConvolutionalVariational(nn.Module):
         Returns:
             a 1D tensor, representing a loss value for each ``x``
         """
+        recon_loss = AutoencoderConvolutionalVariational._reconstruction_loss(recon_x, x, recon_loss_name)
+        kullback_leibler = AutoencoderConvolutionalVariational._kullback_leibler(mu, logvar)
+        return recon_loss + kullback_leibler * kullback_leibler_weight
+
+    @staticmethod
+    def loss_function_multi(recon_x, x, mu, logvar, recon_loss_names=('BCE', 'MSE'), kullback_leibler_weight=0.2):
+        """
+        Calculate several VAE losses at once, each using a different reconstruction loss
+
+        This is equivalent to calling :meth:`loss_function` once per reconstruction loss, except that the
+        Kullback–Leibler divergence is only calculated once and shared by all the losses. The reconstruction
+        losses are not fused: each of them is still a separate pass over ``recon_x`` and ``x``.
+
+        Args:
+            recon_x: the reconstructed x
+            x: the input value
+            mu: the mu encoding of x
+            logvar: the logvar encoding of x
+            recon_loss_names: a sequence of reconstruction loss names. See :meth:`loss_function`
+            kullback_leibler_weight: the weight factor applied on the Kullback–Leibler divergence
+
+        Returns:
+            a tuple of 1D tensors, one for each of ``recon_loss_names``
+        """
+        kullback_leibler = AutoencoderConvolutionalVariational._kullback_leibler(mu, logvar)
+        weighted_kullback_leibler = kullback_leibler * kullback_leibler_weight
+
+        losses = []
+        for recon_loss_name in recon_loss_names:
+            recon_loss = AutoencoderConvolutionalVariational._reconstruction_loss(recon_x, x, recon_loss_name)
+            losses.append(recon_loss + weighted_kullback_leibler)
+        return tuple(losses)
+
+    @staticmethod
+    def _reconstruction_loss(recon_x, x, recon_loss_name):
         if recon_loss_name == 'BCE':
             recon_loss = F.binary_cross_entropy(recon_x, x, reduction='none')
         elif recon_loss_name == 'MSE':
@@ -127,16 +162,16 @@ class AutoencoderConvolutionalVariational(nn.Module):
             recon_loss = torch.nn.PairwiseDistance(p=1, keepdim=True)(recon_x,  x)
         else:
             raise NotImplementedError(f'loss not implemented={recon_loss_name}')
-        recon_loss = flatten(recon_loss).mean(dim=1)
+        return flatten(recon_loss).mean(dim=1)
 
+    @staticmethod
+    def _kullback_leibler(mu, logvar):
         # see Appendix B from VAE paper:
         # Kingma and Welling. Auto-Encoding Variational Bayes. ICLR, 2014
         # https://arxiv.org/abs/1312.6114
         # 0.5 * sum(1 + log(sigma^2) - mu^2 - sigma^2)
         kullback_leibler = -0.5 * (1 + logvar - mu.pow(2) - logvar.exp())
-        kullback_leibler = flatten(kullback_leibler).mean(dim=1)
-
-        return recon_loss + kullback_leibler * kullback_leibler_weight
+        return flatten(kullback_leibler).mean(dim=1)
 
     def sample(self, nb_samples):
         """
@@ -7,6 +7,7 @@ import numpy as np
 
 from trw.train import get_device, collate_list_of_dicts
 from trw.train.utilities import prepare_loss_terms
+from trw.train.trainer import zero_grad
 from trw.utils import len_batch, get_batch_n
 
 
@@ -206,7 +207,7 @@ class Gan(nn.Module):
         #
 
         # discriminator: train with all real
-        self.optmizer_discriminator.zero_grad()
+        zero_grad(self.optmizer_discriminator)
         batch_real = batch
         discriminator_outputs_real = self.discriminator(batch_real, images_real, is_real=True)
 
@@ -233,7 +234,7 @@ class Gan(nn.Module):
         #
         # train generator
         #
-        self.optmizer_generator.zero_grad()
+        zero_grad(self.optmizer_generator)
         discrimator_outputs_generator = self.discriminator(batch, images_fake_orig, is_real=True)
         discrimator_outputs_generator_and_generator_outputs = {**discrimator_outputs_generator, **generator_outputs}
         generator_loss = self.loss_from_outputs_fn(discrimator_outputs_generator_and_generator_outputs, batch, is_training=True)
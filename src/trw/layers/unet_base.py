@@ -1,4 +1,5 @@
 import copy
+import inspect
 from typing import Sequence, Optional, Union, Any, List
 
 from trw.layers.convs import ModuleWithIntermediate
@@ -6,11 +7,16 @@ from typing_extensions import Protocol  # backward compatibility for python 3.6-
 
 import torch
 import torch.nn as nn
+import torch.utils.checkpoint
 from trw.utils import upsample
 from trw.layers.blocks import BlockConvNormActivation, BlockUpDeconvSkipConv, ConvBlockType
 from trw.layers.layer_config import LayerConfig, default_layer_config
 
 
+# `use_reentrant` was introduced in pytorch 1.11
+_CHECKPOINT_HAS_USE_REENTRANT = 'use_reentrant' in inspect.signature(torch.utils.checkpoint.checkpoint).parameters
+
+
 class DownType(Protocol):
     def __call__(
             self,
@@ -135,6 +141,37 @@ class LatentConv(nn.Module):
         return self.ops(x)
 
 
+def checkpoint_block(block: nn.Module, x: torch.Tensor) -> torch.Tensor:
+    """
+    Run a block without storing its intermediate activations: they are recalculated during the backward pass
+
+    The buffers of the block (e.g., batch norm running statistics) are only updated by the forward pass,
+    not by the recalculation.
+    """
+    nb_calls = 0
+
+    def run(block_input):
+        nonlocal nb_calls
+        nb_calls += 1
+        if nb_calls == 1:
+            return block(block_input)
+
+        # recalculation during the backward pass. It may be interrupted as soon as
+        # the required activations are recalculated, so restore the buffers in any case
+        with torch.no_grad():
+            buffers = [(buffer, buffer.clone()) for buffer in block.buffers()]
+        try:
+            return block(block_input)
+        finally:
+            with torch.no_grad():
+                for buffer, value in buffers:
+                    buffer.copy_(value)
+
+    if _CHECKPOINT_HAS_USE_REENTRANT:
+        return torch.utils.checkpoint.checkpoint(run, x, use_reentrant=False)
+    return torch.utils.checkpoint.checkpoint(run, x)
+
+
 class UNetBase(nn.Module, ModuleWithIntermediate):
     """
     Configurable UNet-like architecture
@@ -155,7 +192,8 @@ class UNetBase(nn.Module, ModuleWithIntermediate):
             kernel_size: Optional[int] = 3,
             strides: Union[int, Sequence[int]] = 2,
             activation: Optional[Any] = None,
-            config: LayerConfig = default_layer_config(dimensionality=None)
+            config: LayerConfig = default_layer_config(dimensionality=None),
+            gradient_checkpointing: bool = False
     ):
         """
 
@@ -174,6 +212,9 @@ class UNetBase(nn.Module, ModuleWithIntermediate):
             up_block_fn: a function taking (dim, in_channels, out_channels, bilinear) and returning a nn.Module
             init_block_channels: the number of channels to be used by the init block. If `None`, `channels[0] // 2`
                 will be used
+            gradient_checkpointing: if True, the activations of the encoder blocks are not kept during
+                training but recalculated during the backward pass. This trades extra computations
+                for a lower memory usage (e.g., to train with larger batches)
         """
         assert len(channels) >= 1
         config = copy.copy(config)
@@ -191,6 +232,7 @@ class UNetBase(nn.Module, ModuleWithIntermediate):
         self.init_block_channels = init_block_channels
         self.output_channels = output_channels
         self.latent_channels = latent_channels
+        self.gradient_checkpointing = gradient_checkpointing
 
         if isinstance(strides, int):
             strides = [strides] * len(channels)
@@ -270,8 +312,12 @@ class UNetBase(nn.Module, ModuleWithIntermediate):
     def forward_with_intermediate(self, x: torch.Tensor, latent: Optional[torch.Tensor] = None) -> List[torch.Tensor]:
         prev = self.init_block(x)
         x_n = [prev]
+        checkpointing = self.gradient_checkpointing and self.training and torch.is_grad_enabled()
         for down in self.downs:
-            current = down(prev)
+            if checkpointing:
+                current = checkpoint_block(down, prev)
+            else:
+                current = down(prev)
             x_n.append(current)
             prev = current
 
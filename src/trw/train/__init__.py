@@ -1,4 +1,4 @@
-from .options import create_default_options
+from .options import create_default_options, enable_cudnn_benchmark_and_tf32
 from .utilities import create_or_recreate_folder, set_optimizer_learning_rate, \
     time_it, CleanAddedHooks, safe_filename, \
     get_device, transfer_batch_to_device, find_default_dataset_and_split_names, get_class_name,\
@@ -15,7 +15,8 @@ from .trainer import Trainer, create_losses_fn, epoch_train_eval, eval_loop, tra
     default_sum_all_losses
 from .optimizers import create_sgd_optimizers_fn, create_sgd_optimizers_scheduler_step_lr_fn, \
     create_scheduler_step_lr, create_adam_optimizers_fn, \
-    create_adam_optimizers_scheduler_step_lr_fn, create_optimizers_fn
+    create_adam_optimizers_scheduler_step_lr_fn, create_optimizers_fn, create_sgd, \
+    create_scheduler_one_cycle_lr, create_sgd_optimizers_scheduler_one_cycle_lr_fn
 from .analysis_plots import plot_group_histories, confusion_matrix, classification_report, \
     list_classes_from_mapping, plot_roc, boxplots, export_figure, auroc
 from .callback import Callback
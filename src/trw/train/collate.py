@@ -57,8 +57,8 @@ def collate_tensors(values, device, pin_memory=False, non_blocking=False):
 
     # on torch.Tensor only
     if isinstance(tensor, torch.Tensor):
-        if pin_memory:
-            tensor.pin_memory()
+        if pin_memory and not tensor.is_cuda:
+            tensor = tensor.pin_memory()
         if device is not None and tensor.device != device:
             tensor = tensor.to(device, non_blocking=non_blocking)
     else:
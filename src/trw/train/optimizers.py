@@ -1,4 +1,5 @@
 import functools
+import inspect
 import torch
 import collections
 
@@ -18,6 +19,29 @@ def create_scheduler_step_lr(optimizer, step_size=30, gamma=0.1):
     return torch.optim.lr_scheduler.StepLR(optimizer, step_size=step_size, gamma=gamma)
 
 
+def create_scheduler_one_cycle_lr(optimizer, max_learning_rate, nb_epochs, warmup_fraction=0.3):
+    """
+    Create a one cycle learning rate scheduler: the learning rate is increased up to `max_learning_rate` during
+    the warmup then decreased following a cosine annealing. The momentum of the optimizer is not modified.
+
+    Args:
+        optimizer: the optimizer
+        max_learning_rate: the maximum learning rate, reached at the end of the warmup
+        nb_epochs: the number of epochs of the training. The scheduler is stepped once per epoch
+        warmup_fraction: the fraction of the epochs used to increase the learning rate
+
+    Returns:
+        a learning rate scheduler
+    """
+    assert hasattr(torch.optim.lr_scheduler, 'OneCycleLR'), 'requires pytorch >= 1.3'
+    return torch.optim.lr_scheduler.OneCycleLR(
+        optimizer,
+        max_lr=max_learning_rate,
+        total_steps=nb_epochs,
+        pct_start=warmup_fraction,
+        cycle_momentum=False)
+
+
 def create_optimizers_fn(datasets, model, optimizer_fn, scheduler_fn=None):
     """
     Create an optimizer and scheduler
@@ -107,6 +131,30 @@ def create_adam_optimizers_scheduler_step_lr_fn(datasets, model, learning_rate,
     )
 
 
+def create_sgd(params, **kwargs):
+    """
+    Create a Stochastic gradient descent optimizer updating all the parameters at once.
+
+    If all the parameters are on a CUDA device and it is supported, the parameters are updated
+    by a single fused kernel, else by the multi-tensor (``foreach``) implementation when available.
+
+    Args:
+        params: the parameters to optimize
+        kwargs: the arguments of :class:`torch.optim.SGD`
+
+    Returns:
+        An optimizer
+    """
+    params = list(params)
+    sgd_arguments = inspect.signature(torch.optim.SGD).parameters
+    all_cuda = len(params) > 0 and all(isinstance(p, torch.Tensor) and p.is_cuda for p in params)
+    if 'fused' in sgd_arguments and all_cuda:
+        kwargs.setdefault('fused', True)
+    elif 'foreach' in sgd_arguments:
+        kwargs.setdefault('foreach', True)
+    return torch.optim.SGD(params, **kwargs)
+
+
 def create_sgd_optimizers_fn(datasets, model, learning_rate, momentum=0.9, weight_decay=0, nesterov=False, scheduler_fn=None):
     """
         Create a Stochastic gradient descent optimizer for each of the dataset with optional scheduler
@@ -124,7 +172,7 @@ def create_sgd_optimizers_fn(datasets, model, learning_rate, momentum=0.9, weigh
             An optimizer
         """
     optimizer_fn = functools.partial(
-        torch.optim.SGD,
+        create_sgd,
         lr=learning_rate,
         momentum=momentum,
         weight_decay=weight_decay,
@@ -166,3 +214,44 @@ def create_sgd_optimizers_scheduler_step_lr_fn(
         scheduler_fn=scheduler_fn,
         momentum=momentum,
         nesterov=nesterov)
+
+
+def create_sgd_optimizers_scheduler_one_cycle_lr_fn(
+        datasets,
+        model,
+        learning_rate,
+        nb_epochs,
+        weight_decay=0,
+        momentum=0.9,
+        nesterov=False,
+        warmup_fraction=0.3):
+    """
+        Create a Stochastic gradient descent optimizer for each of the dataset with one cycle learning rate
+        scheduler (warmup then cosine annealing)
+
+        Args:
+            datasets: a dictionary of dataset
+            model: a model to optimize
+            learning_rate: the maximum learning rate, reached at the end of the warmup
+            nb_epochs: the number of epochs of the training
+            weight_decay: the weight decay
+            nesterov: enables Nesterov momentum
+            momentum: the momentum of the SGD
+            warmup_fraction: the fraction of the epochs used to increase the learning rate
+
+        Returns:
+            An optimizer with a one cycle scheduler
+        """
+    scheduler_fn = functools.partial(
+        create_scheduler_one_cycle_lr,
+        max_learning_rate=learning_rate,
+        nb_epochs=nb_epochs,
+        warmup_fraction=warmup_fraction)
+    return create_sgd_optimizers_fn(
+        datasets,
+        model,
+        learning_rate=learning_rate,
+        weight_decay=weight_decay,
+        scheduler_fn=scheduler_fn,
+        momentum=momentum,
+        nesterov=nesterov)
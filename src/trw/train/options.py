@@ -43,12 +43,18 @@ def create_default_options(logging_directory=None, num_epochs=50, device=None):
         'training_parameters': {
             'dropout_probability': 0.5,
             'num_epochs': num_epochs,
+            'gradient_clipping_value': None,  # if not None, the gradients are clipped to [-value, value]
+            'gradient_accumulation_steps': 1,  # number of batches to accumulate the gradient before optimizer step
+            'mixed_precision': None,  # if not None, the type used for mixed precision (e.g., torch.float16 on GPU,
+                                      # torch.bfloat16 on CPU)
         },
         'workflow_options': {
             'device': device,                        # the torch device to be used
             'train_split': 'train',                  # this is the split used for training
             'logging_directory': logging_directory,  # this is where all the tensorboard summary are written
             'trainer_run': 0,                        # this is the run number.
+            'compile_model': False,                  # if True, the model is compiled (`torch.compile`) to run the epochs.
+                                                     # May be a `torch.compile` mode (e.g., 'max-autotune')
 
             'sql_database_view_path': None,  # configuration file for the reporting
             'sql_database_path': None,       # specify where the SQL database for the reporting is stored
@@ -61,3 +67,14 @@ def create_default_options(logging_directory=None, num_epochs=50, device=None):
 
     options['workflow_options']['current_logging_directory'] = options['workflow_options']['logging_directory']
     return options
+
+
+def enable_cudnn_benchmark_and_tf32():
+    """
+    Configure pytorch for models trained on inputs with fixed shapes: cuDNN selects the fastest convolution
+    algorithms for the input shapes and, on Ampere GPUs, the float32 matrix multiplications use TF32 (the
+    float32 convolutions already use TF32 by default)
+    """
+    torch.backends.cudnn.benchmark = True
+    if hasattr(torch, 'set_float32_matmul_precision'):
+        torch.set_float32_matmul_precision('high')
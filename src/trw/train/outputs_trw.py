@@ -569,15 +569,16 @@ class OutputRegression(Output):
             assert weights is not None, 'weight `` could not be found!'.format(self.weight_name)
             assert len(weights) == len(losses), 'must have a weight per sample'
             assert len(weights.shape) == 1, 'must be a 1D vector'
+
+            # weight the loss of each sample by the corresponding weight
+            weighted_losses = weights * losses
         else:
-            weights = torch.ones_like(losses)
+            # no weighting: avoid the allocation and multiplication by unit weights
+            weighted_losses = losses
             
         if self.sample_uid_name is not None and self.sample_uid_name in batch:
             loss_term['uid'] = trw.utils.to_value(batch[self.sample_uid_name])
 
-        # weight the loss of each sample by the corresponding weight
-        weighted_losses = weights * losses
-
         loss_term['losses'] = weighted_losses
         # here we MUST be able to calculate the gradient so don't detach
         loss_term['loss'] = self.loss_scaling * self.loss_reduction(weighted_losses)
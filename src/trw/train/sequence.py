@@ -86,19 +86,20 @@ class Sequence:
         """
         raise NotImplementedError()
     
-    def collate(self, collate_fn=default_collate_fn, device=None):
+    def collate(self, collate_fn=default_collate_fn, device=None, pin_memory=False):
         """
         Aggregate the input batch as a dictionary of torch.Tensor and move the data to the appropriate device
         
         Args:
             collate_fn: the function to collate the input batch
             device: the device where to send the samples. If None, the default device is CPU
+            pin_memory: if True and CUDA is available, the collated CPU tensors will be in page-locked memory
             
         Returns:
             a collated sequence of batches
         """
         from . import sequence_collate
-        return sequence_collate.SequenceCollate(self, collate_fn=collate_fn, device=device)
+        return sequence_collate.SequenceCollate(self, collate_fn=collate_fn, device=device, pin_memory=pin_memory)
 
     def map(self, function_to_run, nb_workers=0, max_jobs_at_once=None, nb_pin_threads=None, queue_timeout=0.1, collate_fn=None):
         """
@@ -18,7 +18,15 @@ class SequenceArray(sequence.Sequence):
     """
     Create a sequence of batches from numpy arrays, lists and :class:`torch.Tensor`
     """
-    def __init__(self, split, sampler=sampler_trw.SamplerRandom(), transforms=None, use_advanced_indexing=True, sample_uid_name=sample_uid_name):
+    def __init__(
+            self,
+            split,
+            sampler=sampler_trw.SamplerRandom(),
+            transforms=None,
+            use_advanced_indexing=True,
+            sample_uid_name=sample_uid_name,
+            nb_augment_workers=0,
+            reuse_batch_buffers=False):
         """
 
         Args:
@@ -28,6 +36,13 @@ class SequenceArray(sequence.Sequence):
             use_advanced_indexing:
             sample_uid_name: if not `None`, create a unique UID per sample so that it is easy to track
                 particular samples (e.g., during data augmentation)
+            nb_augment_workers: if > 0, the `transforms` will be applied by this number of worker processes
+                (see :meth:`trw.train.Sequence.map`) so that the augmentation runs in the background.
+                Note that in this case, the ordering of the batches is not guaranteed
+            reuse_batch_buffers: if True and `use_advanced_indexing` is True, the numpy arrays of a batch are
+                gathered into buffers allocated once per iterator instead of allocating new arrays for each
+                batch. The batches returned by the iterator share these buffers so the content of a batch
+                is overwritten by the next batch: the batch must be copied if it needs to be kept
         """
         super().__init__(None)  # there is no source sequence for this as we get our input from a numpy split
         self.split = split
@@ -36,11 +51,24 @@ class SequenceArray(sequence.Sequence):
         self.sampler_iterator = None
         self.transforms = transforms
         self.use_advanced_indexing = use_advanced_indexing
+        self.reuse_batch_buffers = reuse_batch_buffers
 
         # create a unique UID
         if sample_uid_name is not None and sample_uid_name not in split:
             split[sample_uid_name] = np.asarray(np.arange(trw.utils.len_batch(split)))
 
+        self.sequence_augmented = None
+        if transforms is not None and nb_augment_workers > 0:
+            # the batches are created by a sequence without transforms and the transforms
+            # are executed by the worker processes of a mapped sequence
+            self.sequence_augmented = SequenceArray(
+                split,
+                sampler=sampler,
+                use_advanced_indexing=use_advanced_indexing,
+                sample_uid_name=None,
+                reuse_batch_buffers=reuse_batch_buffers
+            ).map(transforms, nb_workers=nb_augment_workers, max_jobs_at_once=2 * nb_augment_workers)
+
     def subsample(self, nb_samples):
         # get random indices
         subsample_sample = sampler_trw.SamplerRandom(batch_size=nb_samples)
@@ -100,10 +128,25 @@ class SequenceArray(sequence.Sequence):
         return get_batch_n(split, nb_samples, indices, transforms, use_advanced_indexing)
 
     def __iter__(self):
+        if self.sequence_augmented is not None:
+            return self.sequence_augmented.__iter__()
+
         # make sure the sampler is copied so that we can have multiple iterators of the
         # same sequence
         return SequenceIteratorArray(self, copy.deepcopy(self.sampler))
 
+    def has_background_jobs(self):
+        if self.sequence_augmented is not None:
+            return self.sequence_augmented.has_background_jobs()
+        return False
+
+    def close(self):
+        """
+        Finish and join the augmentation worker processes, if any
+        """
+        if self.sequence_augmented is not None:
+            self.sequence_augmented.close()
+
 
 class SequenceIteratorArray(sequence.SequenceIterator):
     """
@@ -121,6 +164,10 @@ class SequenceIteratorArray(sequence.SequenceIterator):
         self.sampler.initializer(self.base_sequence.split)
         self.sampler_iterator = iter(self.sampler)
 
+        self.batch_buffers = None
+        if self.base_sequence.reuse_batch_buffers:
+            self.batch_buffers = {}
+
     def __next__(self):
         indices = self.sampler_iterator.__next__()
         if not isinstance(indices, (np.ndarray, collections.Sequence)):
@@ -131,4 +178,5 @@ class SequenceIteratorArray(sequence.SequenceIterator):
             self.nb_samples,
             indices,
             self.base_sequence.transforms,
-            self.base_sequence.use_advanced_indexing)
+            self.base_sequence.use_advanced_indexing,
+            batch_buffers=self.batch_buffers)
@@ -1,3 +1,4 @@
+import torch
 from trw.train import collate
 from trw.train import sequence
 
@@ -10,13 +11,16 @@ class SequenceCollate(sequence.Sequence):
     concatenated on axis 0. Often used in conjunction of :class:`trw.train.SequenceAsyncReservoir`
     and :class:`trw.train.SequenceMap`.
     """
-    def __init__(self, source_split, collate_fn=collate.default_collate_fn, device=None):
+    def __init__(self, source_split, collate_fn=collate.default_collate_fn, device=None, pin_memory=False):
         """
         Group the samples into a batch.
 
         :param source_split: the source sequence
         :param device: the device where to send the samples
         :param collate_fn: the function to assemble a list of items. If None, return the items as they were in `source_split`
+        :param pin_memory: if True and CUDA is available, the CPU tensors of the collated batch are copied to page-locked
+            memory so that they can be transferred asynchronously to the GPU (e.g., `non_blocking=True`). `collate_fn`
+            must then accept a `pin_memory` argument
         """
         super().__init__(source_split)
 
@@ -24,18 +28,22 @@ class SequenceCollate(sequence.Sequence):
         self.source_split = source_split
         self.collate_fn = collate_fn
         self.device = device
+        self.pin_memory = pin_memory and torch.cuda.is_available()
 
     def subsample(self, nb_samples):
         subsampled_source = self.source_split.subsample(nb_samples)
-        return SequenceCollate(subsampled_source, collate_fn=self.collate_fn, device=self.device)
+        return SequenceCollate(subsampled_source, collate_fn=self.collate_fn, device=self.device, pin_memory=self.pin_memory)
 
     def subsample_uids(self, uids, uids_name, new_sampler=None):
         subsampled_source = self.source_split.subsample_uids(uids, uids_name, new_sampler)
-        return SequenceCollate(subsampled_source, collate_fn=self.collate_fn, device=self.device)
+        return SequenceCollate(subsampled_source, collate_fn=self.collate_fn, device=self.device, pin_memory=self.pin_memory)
 
     def __next__(self):
         items = self.iter_source.__next__()
-        items = self.collate_fn(items, device=self.device)
+        if self.pin_memory:
+            items = self.collate_fn(items, device=self.device, pin_memory=True)
+        else:
+            items = self.collate_fn(items, device=self.device)
         return items
 
     def __iter__(self):
@@ -10,7 +10,11 @@ import numbers
 import os
 import pickle
 import time
+import io
+import contextlib
+import inspect
 import itertools
+import weakref
 
 import trw
 import trw.utils
@@ -42,6 +46,13 @@ from trw.train.utilities import prepare_loss_terms, default_sum_all_losses, post
 
 logger = logging.getLogger(__name__)
 
+# for each optimizer type, `True` if its `zero_grad` supports `set_to_none` (introduced in pytorch 1.7)
+_ZERO_GRAD_HAS_SET_TO_NONE = {}
+
+# the gradient scaler of each optimizer. The loss scaling MUST be persisted between epochs but
+# the scalers are kept out of the options as these are serialized with the results
+_GRAD_SCALERS = weakref.WeakKeyDictionary()
+
 
 def create_losses_fn(datasets, generic_loss):
     """
@@ -179,6 +190,92 @@ def loss_term_cleanup(loss_terms):
             ref.loss_term_cleanup(loss_term)
 
 
+def zero_grad(optimizer):
+    """
+    Reset the gradients of the parameters optimized by ``optimizer``.
+
+    If supported, the gradients are set to ``None`` rather than filled with zeros (this avoids
+    a memory write over all the gradients). The gradients will be allocated by the next backward pass.
+    """
+    optimizer_type = type(optimizer)
+    has_set_to_none = _ZERO_GRAD_HAS_SET_TO_NONE.get(optimizer_type)
+    if has_set_to_none is None:
+        # custom optimizers may override `zero_grad` without `set_to_none`
+        has_set_to_none = 'set_to_none' in inspect.signature(optimizer.zero_grad).parameters
+        _ZERO_GRAD_HAS_SET_TO_NONE[optimizer_type] = has_set_to_none
+
+    if has_set_to_none:
+        optimizer.zero_grad(set_to_none=True)
+    else:
+        optimizer.zero_grad()
+
+
+def clip_gradients(model, optimizer, gradient_clipping_value, grad_scaler=None):
+    """
+    Clip the gradients of the model. If a gradient scaler is used, the gradients
+    of the optimizer are unscaled first.
+    """
+    if grad_scaler is not None:
+        grad_scaler.unscale_(optimizer)
+    utilities.apply_gradient_clipping(model, gradient_clipping_value)
+
+
+def scale_gradients(optimizer, factor):
+    """
+    Multiply the gradients of the parameters optimized by ``optimizer`` by ``factor``
+    """
+    with torch.no_grad():
+        for group in optimizer.param_groups:
+            for parameter in group['params']:
+                if parameter.grad is not None:
+                    parameter.grad.mul_(factor)
+
+
+def optimizer_step(optimizer, grad_scaler=None):
+    """
+    Perform the optimizer step, through the gradient scaler if any
+    """
+    if grad_scaler is not None:
+        grad_scaler.step(optimizer)
+        grad_scaler.update()
+    else:
+        optimizer.step()
+
+
+def create_autocast(device, mixed_precision):
+    """
+    Create the automatic mixed precision context for the forward pass and the losses
+
+    Args:
+        device: the device the model is run on
+        mixed_precision: if not `None`, the type used for mixed precision (e.g., `torch.float16`)
+
+    Returns:
+        a context manager
+    """
+    if mixed_precision is None:
+        return contextlib.nullcontext()
+    assert hasattr(torch, 'autocast'), 'mixed precision requires pytorch >= 1.10'
+    return torch.autocast(device_type=torch.device(device).type, dtype=mixed_precision)
+
+
+def get_grad_scaler(optimizer, device):
+    """
+    Return the gradient scaler of ``optimizer`` for `torch.float16` mixed precision, created if needed.
+    The scaler is only enabled on CUDA devices
+    """
+    grad_scaler = _GRAD_SCALERS.get(optimizer)
+    if grad_scaler is None:
+        enabled = torch.device(device).type == 'cuda'
+        if hasattr(torch, 'amp') and hasattr(torch.amp, 'GradScaler'):
+            grad_scaler = torch.amp.GradScaler('cuda', enabled=enabled)
+        else:
+            # pytorch < 2.3
+            grad_scaler = torch.cuda.amp.GradScaler(enabled=enabled)
+        _GRAD_SCALERS[optimizer] = grad_scaler
+    return grad_scaler
+
+
 def train_loop(
         device,
         dataset_name,
@@ -189,7 +286,11 @@ def train_loop(
         loss_fn,
         history,
         callbacks_per_batch,
-        callbacks_per_batch_loss_terms):
+        callbacks_per_batch_loss_terms,
+        gradient_clipping_value=None,
+        gradient_accumulation_steps=1,
+        mixed_precision=None,
+        grad_scaler=None):
     """
     Run the train loop (i.e., the model parameters will be updated)
 
@@ -209,10 +310,23 @@ def train_loop(
         callbacks_per_batch: the callbacks to be performed on each batch. if `None`, no callbacks to be run
         callbacks_per_batch_loss_terms: the callbacks to be performed on each loss term. if `None`, no callbacks to be run
         apply_backward: if True, the gradient will be back-propagated
+        gradient_clipping_value: if not `None`, the gradients will be clipped to
+            [-gradient_clipping_value, gradient_clipping_value] after the backward pass
+        gradient_accumulation_steps: the gradients of this number of batches are averaged before
+            the optimizer step is performed. The remaining batches at the end of the epoch are averaged
+            in a last optimizer step
+        mixed_precision: if not `None`, the forward pass and the losses are run with automatic mixed
+            precision (`torch.autocast`) with this type (e.g., `torch.float16` or `torch.bfloat16`). On
+            CPU, prefer `torch.bfloat16`: the `torch.float16` gradients are not scaled and older
+            versions of pytorch disable the CPU autocast for this type
+        grad_scaler: if not `None`, a `torch.amp.GradScaler` used to scale the loss (e.g., required
+            to avoid gradient underflow with `torch.float16` mixed precision)
 
     Notes:
         if ``optimizer`` is None, there MUST be a ``.backward()`` to free graph and memory.
     """
+    assert gradient_accumulation_steps >= 1
+
     # make sure the model is in training mode (e.g., batch norm, dropout)
     model.train()
 
@@ -223,8 +337,10 @@ def train_loop(
     loop_started = time.perf_counter()
     total_collate_and_postprocess = 0.0
     nb_samples = 0
+    nb_accumulated = 0
     try:
-        for i, batch in enumerate(split):
+        # the next batch is transferred to the device while the current batch is processed
+        for i, batch in enumerate(utilities.prefetch_batches_to_device(split, device)):
             assert isinstance(batch, collections.Mapping), 'batch must be a mapping of (feature name, feature values)'
             # calculate the time for batch processing. In particular
             # this may be significant when using large data augmentations
@@ -233,28 +349,36 @@ def train_loop(
             total_batch_processing_time += current_batch_processing
 
             total_collate_and_postprocess_start = time.perf_counter()
-            batch = utilities.transfer_batch_to_device(batch, device)
-            
             postprocess_batch(dataset_name, split_name, batch, callbacks_per_batch, batch_id=i)
             total_collate_and_postprocess_end = time.perf_counter()
             total_collate_and_postprocess += total_collate_and_postprocess_end - total_collate_and_postprocess_start
 
-            if optimizer is not None:
-                optimizer.zero_grad()
+            if optimizer is not None and nb_accumulated == 0:
+                zero_grad(optimizer)
 
-            outputs = model(batch)
-            if outputs is None:
-                # skip this batch
-                continue
+            with create_autocast(device, mixed_precision):
+                outputs = model(batch)
+                if outputs is None:
+                    # skip this batch
+                    continue
 
-            assert isinstance(outputs, collections.Mapping), 'model must create a dict of outputs'
-            loss_terms = prepare_loss_terms(outputs, batch, is_training=True)
-            loss = loss_fn(dataset_name, batch, loss_terms)
+                assert isinstance(outputs, collections.Mapping), 'model must create a dict of outputs'
+                loss_terms = prepare_loss_terms(outputs, batch, is_training=True)
+                loss = loss_fn(dataset_name, batch, loss_terms)
 
             if optimizer is not None and isinstance(loss, torch.Tensor):
                 if isinstance(loss, torch.Tensor):
                     # if there is no optimizer, it means we did not want to change the parameters
-                    loss.backward()
+                    loss_backward = loss
+                    if gradient_accumulation_steps > 1:
+                        # average the gradients of the accumulated batches
+                        loss_backward = loss_backward / gradient_accumulation_steps
+                    if grad_scaler is not None:
+                        loss_backward = grad_scaler.scale(loss_backward)
+                    loss_backward.backward()
+
+                    if gradient_clipping_value is not None and nb_accumulated + 1 == gradient_accumulation_steps:
+                        clip_gradients(model, optimizer, gradient_clipping_value, grad_scaler)
                 else:
                     logger.warning('No backward calculated for={}/{}'.format(dataset_name, split_name))
             loss_terms['overall_loss'] = {'loss': float(trw.utils.to_value(loss))}
@@ -265,7 +389,10 @@ def train_loop(
 
             # call optimizer step after the callbacks (e.g., a callback could be used to clip the gradient)
             if optimizer is not None:
-                optimizer.step()
+                nb_accumulated += 1
+                if nb_accumulated == gradient_accumulation_steps:
+                    optimizer_step(optimizer, grad_scaler)
+                    nb_accumulated = 0
 
             # once we are done, we want to perform some cleanup. For example, we do NOT want to keep CUDA based
             # tensors in the output so we can run clean up to transfer CUDA based memory to numpy
@@ -277,6 +404,16 @@ def train_loop(
 
     except StopIteration:
         pass
+
+    if nb_accumulated > 0:
+        # the last batches did not fill a complete accumulation: do not discard their gradients. Their
+        # losses were divided by `gradient_accumulation_steps`, so rescale the gradients to average
+        # over the accumulated batches only
+        scale_gradients(optimizer, gradient_accumulation_steps / nb_accumulated)
+        if gradient_clipping_value is not None:
+            clip_gradients(model, optimizer, gradient_clipping_value, grad_scaler)
+        optimizer_step(optimizer, grad_scaler)
+
     loop_ended = time.perf_counter()
     
     logger.debug('nb_samples={}, train_loop total_batch_processing_time={}, loop_time={},'
@@ -299,7 +436,8 @@ def eval_loop(
         loss_fn,
         history,
         callbacks_per_batch=None,
-        callbacks_per_batch_loss_terms=None):
+        callbacks_per_batch_loss_terms=None,
+        mixed_precision=None):
     """
     Run the eval loop (i.e., the model parameters will NOT be updated)
     
@@ -314,6 +452,8 @@ def eval_loop(
     :param history:
     :param callbacks_per_batch:
     :param callbacks_per_batch_loss_terms:
+    :param mixed_precision: if not `None`, the forward pass and the losses are run with automatic mixed
+        precision (`torch.autocast`) with this type
     :return:
     """
     all_loss_terms = []
@@ -322,11 +462,11 @@ def eval_loop(
     model.eval()
 
     try:
-        for i, batch in enumerate(split):
+        for i, batch in enumerate(utilities.prefetch_batches_to_device(split, device)):
             assert isinstance(batch, collections.Mapping), 'batch must be a mapping of (feature name, feature values)'
-            batch = utilities.transfer_batch_to_device(batch, device=device)
             postprocess_batch(dataset_name, split_name, batch, callbacks_per_batch, batch_id=i)
-            with torch.no_grad():  # do not keep track of the gradient as we are just evaluating
+            # do not keep track of the gradient as we are just evaluating
+            with torch.no_grad(), create_autocast(device, mixed_precision):
                 outputs = model(batch)
                 if outputs is None:
                     # skip this batch
@@ -395,6 +535,7 @@ def epoch_train_eval(
     """
     device = options['workflow_options']['device']
     train_split_name = options['workflow_options']['train_split']
+    mixed_precision = options['training_parameters'].get('mixed_precision')
     history_by_dataset_epoch = collections.OrderedDict()
     outputs_by_dataset_epoch = collections.OrderedDict()
     for dataset_name, dataset in datasets.items():
@@ -406,6 +547,10 @@ def epoch_train_eval(
         if schedulers is not None:
             scheduler = schedulers.get(dataset_name)
 
+        grad_scaler = None
+        if optimizer is not None and mixed_precision == torch.float16:
+            grad_scaler = get_grad_scaler(optimizer, device)
+
         dataset_history = collections.OrderedDict()
         dataset_outputs = collections.OrderedDict()
         for split_name, split in dataset.items():
@@ -425,7 +570,11 @@ def epoch_train_eval(
                     loss_fn,
                     history,
                     callbacks_per_batch=callbacks_per_batch,
-                    callbacks_per_batch_loss_terms=callbacks_per_batch_loss_terms)
+                    callbacks_per_batch_loss_terms=callbacks_per_batch_loss_terms,
+                    gradient_clipping_value=options['training_parameters'].get('gradient_clipping_value'),
+                    gradient_accumulation_steps=options['training_parameters'].get('gradient_accumulation_steps', 1),
+                    mixed_precision=mixed_precision,
+                    grad_scaler=grad_scaler)
             else:
                 if not run_eval or eval_loop_fn is None:
                     # we should not run the evaluation. Skip this!
@@ -440,7 +589,8 @@ def epoch_train_eval(
                     loss_fn,
                     history,
                     callbacks_per_batch=callbacks_per_batch,
-                    callbacks_per_batch_loss_terms=callbacks_per_batch_loss_terms)
+                    callbacks_per_batch_loss_terms=callbacks_per_batch_loss_terms,
+                    mixed_precision=mixed_precision)
             time_end = time.perf_counter()
             assert isinstance(all_loss_terms, collections.Sequence), '`all_loss_terms` must be a sequence'
 
@@ -656,10 +806,16 @@ class Trainer:
             if sql_database is not None:
                 del result_cp['options']['workflow_options']['sql_database']
 
+        # serialize in memory first so that the files are written with a single
+        # `write` rather than the many small writes of the pickler
         result_cp_path = path + '.result'
         with open(result_cp_path, 'wb') as f:
-            pickle_module.dump(result_cp, f)
-        torch.save(model, path, pickle_module=pickle_module)
+            f.write(pickle_module.dumps(result_cp))
+
+        buffer = io.BytesIO()
+        torch.save(model, buffer, pickle_module=pickle_module)
+        with open(path, 'wb') as f:
+            f.write(buffer.getbuffer())
 
         if sql_database is not None:
             # TODO find a cleaner and generic way of doing this...
@@ -796,6 +952,20 @@ class Trainer:
 
         logger.info('model moved to device={}'.format(device))
         model.to(device)
+
+        # the model used to run the epochs. The optimizers and callbacks
+        # will use the original model
+        model_run = model
+        compile_model = options['workflow_options'].get('compile_model')
+        if compile_model:
+            if not hasattr(torch, 'compile'):
+                logger.warning('`torch.compile` is not available for this version of pytorch. Model not compiled!')
+            elif os.environ.get('PYTORCH_JIT', '1') == '0':
+                logger.info('PYTORCH_JIT=0, model not compiled!')
+            else:
+                compile_mode = compile_model if isinstance(compile_model, str) else 'reduce-overhead'
+                logger.info('compiling model, mode={}...'.format(compile_mode))
+                model_run = torch.compile(model, mode=compile_mode, fullgraph=False)
         
         # instantiate the optimizer and scheduler
         logger.info('creating optimizers...')
@@ -859,7 +1029,7 @@ class Trainer:
                 options,
                 datasets,
                 optimizers,
-                model,
+                model_run,
                 losses,
                 schedulers,
                 history,
@@ -895,7 +1065,7 @@ class Trainer:
                 options,
                 datasets,
                 None,
-                model,
+                model_run,
                 losses,
                 None,
                 history,
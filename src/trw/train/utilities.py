@@ -259,6 +259,78 @@ def transfer_batch_to_device(batch, device, non_blocking=True):
     return device_batch
 
 
+def _record_stream(value, stream):
+    """
+    Record ``stream`` on all the CUDA tensors of ``value`` (recursively in the mappings, lists and tuples)
+    """
+    if isinstance(value, torch.Tensor):
+        if value.device.type == 'cuda':
+            value.record_stream(stream)
+    elif isinstance(value, collections.Mapping):
+        for v in value.values():
+            _record_stream(v, stream)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _record_stream(v, stream)
+
+
+def prefetch_batches_to_device(batches, device, non_blocking=True):
+    """
+    Iterate the batches transferred to the specified device.
+
+    For CUDA devices, the transfer of the next batch is started on a dedicated stream before the current
+    batch is returned so that the host to device copy overlaps with the processing of the current batch. The
+    batches must be in pinned memory for the copy to be asynchronous (see :meth:`trw.train.Sequence.collate`).
+
+    The next batch is only created once the transfer of the current batch is completed so that sequences reusing
+    the memory of their batches (e.g., :class:`trw.train.SequenceArray` with `reuse_batch_buffers`) are supported.
+
+    Args:
+        batches: an iterable of batches
+        device: the device to move the tensors to
+        non_blocking: non blocking memory transfer to GPU
+
+    Returns:
+        an iterator of batches on the specified device
+    """
+    device = torch.device(device)
+    if device.type != 'cuda':
+        for batch in batches:
+            yield transfer_batch_to_device(batch, device, non_blocking=non_blocking)
+        return
+
+    stream = torch.cuda.Stream(device=device)
+
+    def transfer(batch):
+        with torch.cuda.stream(stream):
+            device_batch = transfer_batch_to_device(batch, device, non_blocking=non_blocking)
+            transferred = torch.cuda.Event()
+            transferred.record(stream)
+        return device_batch, transferred
+
+    def wait(device_batch, transferred):
+        current_stream = torch.cuda.current_stream(device)
+        current_stream.wait_event(transferred)
+        # the memory was allocated on the transfer stream: make sure it is not
+        # reused before the computations on the current stream are done
+        _record_stream(device_batch, current_stream)
+        return device_batch
+
+    previous = None
+    for batch in batches:
+        current = transfer(batch)
+        if previous is not None:
+            yield wait(*previous)
+
+        # the host memory of `batch` may be reused by the next batch: the
+        # transfer must be completed before the next batch is created
+        current[1].synchronize()
+        previous = current
+
+    if previous is not None:
+        yield wait(*previous)
+
+
 class CleanAddedHooks:
     """
     Context manager that automatically track added hooks on the model and remove them when
@@ -390,48 +462,70 @@ def find_default_dataset_and_split_names(datasets, default_dataset_name=None, de
     return default_dataset_name, default_split_name
 
 
-def make_triplet_indices(targets):
+def _group_by_target(targets):
     """
-    Make random index triplets (anchor, positive, negative) such that ``anchor`` and ``positive``
-        belong to the same target while ``negative`` belongs to a different target
+    Group the samples by target using a single sort
 
     Args:
         targets: a 1D integral tensor in range [0..C]
 
     Returns:
-        a tuple of indices (samples, samples_positive, samples_negative)
+        a tuple (order, segment, segment_start, segment_size) where ``order`` are the sample indices sorted
+        by target, ``segment`` the target group of each sorted sample, ``segment_start`` and ``segment_size``
+        the first sorted position and the number of samples of the target group of each sorted sample
     """
-    # group samples by class
-    samples_by_class = collections.defaultdict(list)
-    targets = to_value(targets)
-    for index, c in enumerate(targets):
-        samples_by_class[c].append(index)
+    targets = np.asarray(to_value(targets))
+    assert len(targets.shape) == 1, 'must be a 1D array of targets'
+    order = np.argsort(targets, kind='stable')
+    targets_sorted = targets[order]
 
-    # create the (sample, sample+, sample-) groups
-    samples_all = []
-    samples_positive_all = []
-    samples_negative_all = []
-    for c, c_indexes in samples_by_class.items():
-        samples = c_indexes.copy()
-        samples_positive = c_indexes
-        np.random.shuffle(c_indexes)
+    is_start = np.ones(len(targets), dtype=bool)
+    is_start[1:] = targets_sorted[1:] != targets_sorted[:-1]
+    starts = np.flatnonzero(is_start)
+    sizes = np.diff(np.append(starts, len(targets)))
+    assert len(starts) >= 2, 'must have at least 2 different targets'
 
-        other = [idx for cc, idx in samples_by_class.items() if cc != c]
-        other = np.concatenate(other)
+    segment = np.cumsum(is_start) - 1
+    return order, segment, starts[segment], sizes[segment]
 
-        # sample with replacement in case the ``negative`` sample are less
-        # than the ``positive`` samples
-        samples_negative = np.random.choice(other, len(samples))
 
-        samples_all.append(samples)
-        samples_positive_all.append(samples_positive)
-        samples_negative_all.append(samples_negative)
+def _shuffle_within_group(order, segment):
+    """
+    Shuffle the sorted samples while keeping each sample in its target group
+    """
+    return order[np.argsort(segment + np.random.rand(len(segment)), kind='stable')]
 
-    samples_all = np.concatenate(samples_all)
-    samples_positive_all = np.concatenate(samples_positive_all)
-    samples_negative_all = np.concatenate(samples_negative_all)
-    min_samples = min(len(samples_all), len(samples_negative_all))
-    return samples_all[:min_samples], samples_positive_all[:min_samples], samples_negative_all[:min_samples]
+
+def _sample_other_group(order, segment_start, segment_size):
+    """
+    For each sorted sample, sample (with replacement) another sample belonging to a different target group
+    """
+    # sample in the range of samples NOT in the target group, then
+    # skip over the target group
+    position = np.random.randint(0, len(order) - segment_size)
+    position = np.where(position >= segment_start, position + segment_size, position)
+    return order[position]
+
+
+def make_triplet_indices(targets):
+    """
+    Make random index triplets (anchor, positive, negative) such that ``anchor`` and ``positive``
+        belong to the same target while ``negative`` belongs to a different target
+
+    Args:
+        targets: a 1D integral tensor in range [0..C]
+
+    Returns:
+        a tuple of indices (samples, samples_positive, samples_negative)
+    """
+    order, segment, segment_start, segment_size = _group_by_target(targets)
+
+    # the positive samples are a permutation of the samples of the same target while
+    # the negative samples are sampled with replacement in case the ``negative`` sample
+    # are less than the ``positive`` samples
+    samples_positive = _shuffle_within_group(order, segment)
+    samples_negative = _sample_other_group(order, segment_start, segment_size)
+    return order, samples_positive, samples_negative
 
 
 def make_pair_indices(targets, same_target_ratio=0.5):
@@ -446,40 +540,20 @@ def make_pair_indices(targets, same_target_ratio=0.5):
     Returns:
         a tuple with (samples_0 indices, samples_1 indices, same_target)
     """
-    # group samples by class
-    samples_by_class = collections.defaultdict(list)
-    classes = to_value(targets)
-    for index, c in enumerate(classes):
-        samples_by_class[c].append(index)
-    samples_by_class = {name: np.asarray(value) for name, value in samples_by_class.items()}
-
-    # create the (sample, sample+, sample-) groups
-    samples_0 = []
-    samples_1 = []
-    same_target = []
-    for c, c_indexes in samples_by_class.items():
-        samples = c_indexes.copy()
-        np.random.shuffle(c_indexes)
-        nb_same_targets = int(same_target_ratio * len(c_indexes))
-
-        other = [idx for cc, idx in samples_by_class.items() if cc != c]
-        other = np.concatenate(other)
-        np.random.shuffle(other)
-
-        samples_0.append(samples)
-        samples_positive = c_indexes[:nb_same_targets]
-        same_target += [1] * len(samples_positive)
-        # expect to have more negative than positive, so for the negative
-        # pick the remaining
-        samples_negative = other[:len(c_indexes) - len(samples_positive)]
-        same_target += [0] * len(samples_negative)
-        samples_1.append(np.concatenate((samples_positive, samples_negative)))
-
-    # in case the assumption was wrong (we, in fact, have more positive than negative)
-    # shorten the batch
-    samples_0 = samples_0[:len(samples_1)]
-
-    return np.concatenate(samples_0), np.concatenate(samples_1), np.asarray(same_target)
+    order, segment, segment_start, segment_size = _group_by_target(targets)
+
+    # for each target, the first ``same_target_ratio`` samples are paired with a sample of
+    # the same target and the remaining with a sample of a different target
+    position_in_segment = np.arange(len(order)) - segment_start
+    nb_same_targets = (same_target_ratio * segment_size).astype(np.int64)
+    same_target = position_in_segment < nb_same_targets
+
+    samples_1 = np.where(
+        same_target,
+        _shuffle_within_group(order, segment),
+        _sample_other_group(order, segment_start, segment_size))
+
+    return order, samples_1, same_target.astype(np.int64)
 
 
 def update_json_config(path_to_json, config_update):
@@ -601,9 +675,10 @@ def apply_spectral_norm(
 
 def apply_gradient_clipping(module: nn.Module, value):
     """
-    Apply gradient clipping recursively on a module as callback.
+    Apply gradient clipping on the parameters of a module.
 
-    Every time the gradient is calculated, it is intercepted and clipping applied.
+    The gradients are clipped in place, so this must be called after the backward pass
+    and before the optimizer step.
 
     Args:
         module: a module where sub-modules will have their gradients clipped
@@ -611,5 +686,4 @@ def apply_gradient_clipping(module: nn.Module, value):
 
     """
     assert value >= 0
-    for p in module.parameters():
-        p.register_hook(lambda gradient: torch.clamp(gradient, -value, value))
+    torch.nn.utils.clip_grad_value_(module.parameters(), clip_value=value)
@@ -23,6 +23,7 @@ from .transforms import Transform, TransformBatchWithCriteria, criteria_feature_
 from .transforms_random_crop_pad import TransformRandomCropPad
 from .transforms_random_flip import TransformRandomFlip
 from .transforms_random_cutout import TransformRandomCutout
+from .transforms_random_cutout_crop_pad_flip import TransformRandomCutoutCropPadFlip
 from .transforms_resize import TransformResize
 from .transforms_normalize_intensity import TransformNormalizeIntensity
 from .transforms_compose import TransformCompose
@@ -1,11 +1,18 @@
+import warnings
 from typing import Union, Tuple, List
 
 import numpy as np
 import torch
-from typing import Sequence
+from numpy.lib.stride_tricks import as_strided
+from typing import Sequence, Optional
 
 from trw.basic_typing import TensorNCX
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 
 def _crop_5d(image, min, max):
     return image[min[0]:max[0], min[1]:max[1], min[2]:max[2], min[3]:max[3], min[4]:max[4]]
@@ -98,6 +105,86 @@ def transform_batch_random_crop_offset(array: TensorNCX, crop_shape: Sequence[Un
     return offsets
 
 
+def _batch_crop_windows(array: TensorNCX, crop_shape: Sequence[int]) -> TensorNCX:
+    """
+    Create a view of `array` with all the possible crops of shape `crop_shape`
+
+    Args:
+        array: a numpy or Torch array of shape [N, X0, ..., Xn]
+        crop_shape: the shape of the crop [C0, ..., Cn]
+
+    Returns:
+        a view of shape [N, X0 - C0 + 1, ..., Xn - Cn + 1, C0, ..., Cn]. No data is copied
+    """
+    if isinstance(array, np.ndarray):
+        shape = [array.shape[0]] + [s - c + 1 for s, c in zip(array.shape[1:], crop_shape)] + list(crop_shape)
+        strides = array.strides + array.strides[1:]
+        return as_strided(array, shape=shape, strides=strides, writeable=False)
+
+    windows = array
+    for dim, size in enumerate(crop_shape):
+        windows = windows.unfold(dim + 1, size, 1)
+    return windows
+
+
+def numba_kernel_supports(dtype) -> bool:
+    """
+    Return `True` if arrays of type `dtype` can be processed by the compiled numba kernels
+    (i.e., numba is installed and `dtype` is a native integer, boolean, float32 or float64 type)
+    """
+    if numba is None:
+        return False
+    dtype = np.dtype(dtype)
+    return dtype.isnative and (dtype.kind in 'iub' or dtype in (np.float32, np.float64))
+
+
+if numba is not None:
+    # errors raised when a kernel can't be compiled for the given arguments or loaded
+    NUMBA_KERNEL_ERRORS = (numba.core.errors.NumbaError, NotImplementedError, ImportError)
+
+    @numba.njit(parallel=True)
+    def _crop_4d_kernel(array, offsets, output):
+        for n in numba.prange(output.shape[0]):
+            o0 = offsets[n, 0]
+            o1 = offsets[n, 1]
+            o2 = offsets[n, 2]
+            for i0 in range(output.shape[1]):
+                for i1 in range(output.shape[2]):
+                    for i2 in range(output.shape[3]):
+                        output[n, i0, i1, i2] = array[n, o0 + i0, o1 + i1, o2 + i2]
+else:
+    NUMBA_KERNEL_ERRORS = ()
+    _crop_4d_kernel = None
+
+
+def _crop_4d_numba(array: np.ndarray, crop_shape: Sequence[int], offsets: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Crop the samples of a 4D numpy array in parallel using the compiled kernel
+
+    Returns:
+        the cropped array or `None` if the kernel could not be run
+    """
+    output = np.empty([array.shape[0]] + list(crop_shape), dtype=array.dtype)
+    try:
+        _crop_4d_kernel(array, offsets, output)
+    except NUMBA_KERNEL_ERRORS as e:
+        warnings.warn(f'numba crop kernel failed, falling back to the gather crop. Exception={e}')
+        return None
+    return output
+
+
+def _crop_gather(array: TensorNCX, crop_shape: Sequence[int], offsets: np.ndarray) -> TensorNCX:
+    """
+    Crop all the samples at once: select, for each sample, the crop window at its offset.
+    This is a single gather operation rather than one slicing per sample
+    """
+    windows = _batch_crop_windows(array, crop_shape)
+    indices = [np.arange(array.shape[0])] + [offsets[:, dim] for dim in range(len(crop_shape))]
+    if isinstance(array, np.ndarray):
+        return windows[tuple(indices)]
+    return windows[tuple(torch.from_numpy(i).to(array.device) for i in indices)]
+
+
 def transform_batch_random_crop(
         array: TensorNCX,
         crop_shape: Sequence[Union[int, None]],
@@ -106,6 +193,10 @@ def transform_batch_random_crop(
     """
     Randomly crop a numpy array of samples given a target size. This works for an arbitrary number of dimensions
 
+    If `numba` is installed, 4D numpy arrays (e.g., NCHW) of a supported type (see :func:`numba_kernel_supports`)
+    are cropped in parallel using a compiled kernel. The kernel is compiled once per process (the compilation is
+    not cached on disk to avoid loading stale kernels)
+
     Args:
         array: a numpy or Torch array. Samples are stored in the first dimension
         crop_shape: a sequence of size `len(array.shape)-1` indicating the shape of the crop. If `None` in one
@@ -117,9 +208,6 @@ def transform_batch_random_crop(
     Returns:
         a cropped array and optionally the crop positions
     """
-    nb_dims = len(array.shape) - 1
-    nb_samples = array.shape[0]
-
     is_numpy = isinstance(array, np.ndarray)
     is_torch = isinstance(array, torch.Tensor)
     assert is_numpy or is_torch, 'must be a numpy array or pytorch.Tensor!'
@@ -130,34 +218,17 @@ def transform_batch_random_crop(
         assert len(offsets) == len(array)
         assert len(offsets[0]) == len(array.shape[1:])
 
-    # select the crop function according to dimension
-    if nb_dims == 1:
-        crop_fn = _crop_1d
-    elif nb_dims == 2:
-        crop_fn = _crop_2d
-    elif nb_dims == 3:
-        crop_fn = _crop_3d
-    elif nb_dims == 4:
-        crop_fn = _crop_4d
-    elif nb_dims == 5:
-        crop_fn = _crop_5d
-    else:
-        assert 0, 'TODO implement for generic dimension'
-
-    # handle the `None` in crop shape. In that case crop the whole dimension
-    crop_shape = [s if s is not None else array.shape[d + 1] for d, s in enumerate(crop_shape)]
-
-    cropped_array = []
-    for n in range(nb_samples):
-        min_corner = np.asarray(offsets[n])
-        cropped_array.append(crop_fn(array[n], min_corner, min_corner + crop_shape))
-
-    if is_numpy:
-        output = np.asarray(cropped_array)
-    elif is_torch:
-        output = torch.stack(cropped_array)
-    else:
-        assert 0, 'unreachable!'
+    # handle the `None` in crop shape. In that case crop the whole dimension. The crop
+    # is limited to the array shape (e.g., joint crop of arrays with different number of filters)
+    crop_shape = [min(s, array.shape[d + 1]) if s is not None else array.shape[d + 1] for d, s in enumerate(crop_shape)]
+
+    offsets = np.asarray(offsets)
+    output = None
+    if is_numpy and len(crop_shape) == 3 and numba_kernel_supports(array.dtype):
+        # numba is available: crop the samples in parallel using a compiled kernel
+        output = _crop_4d_numba(array, crop_shape, offsets)
+    if output is None:
+        output = _crop_gather(array, crop_shape, offsets)
 
     if return_offsets:
         return output, offsets
@@ -0,0 +1,234 @@
+import collections
+import warnings
+
+import functools
+from typing import Optional, Callable, List
+
+import numpy as np
+import torch
+from trw.transforms import transforms
+from trw.basic_typing import ShapeCX, Batch, TensorNCX
+from trw.transforms.crop import numba_kernel_supports, NUMBA_KERNEL_ERRORS
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _random_parameters(shape, cutout_size, padding, flip_axis, flip_probability):
+    """
+    Calculate for each sample the cutout position, the crop offset and if the sample is flipped
+    """
+    nb_samples = shape[0]
+    sample_shape = shape[1:]
+    assert len(cutout_size) == len(sample_shape), f'expected cutout_size with {len(sample_shape)} dimensions'
+    assert len(padding) == len(sample_shape), f'expected padding with {len(sample_shape)} dimensions'
+
+    cutout_min = np.stack(
+        [np.random.randint(0, s - c + 1, nb_samples) for s, c in zip(sample_shape, cutout_size)], axis=1)
+    crop_offsets = np.stack([np.random.randint(0, 2 * p + 1, nb_samples) for p in padding], axis=1)
+    flips = np.zeros([nb_samples, len(sample_shape)], dtype=bool)
+    flips[:, flip_axis - 1] = np.random.rand(nb_samples) <= flip_probability
+    return cutout_min, crop_offsets, flips
+
+
+def _source_indices(size, padding, offsets, flips):
+    """
+    For each sample and output index of a dimension, calculate the index of the original array: the
+    sample is flipped, then edge padded and finally cropped at `offsets`
+    """
+    i = np.arange(size)[np.newaxis, :]
+    i = np.where(flips[:, np.newaxis], size - 1 - i, i)
+    i = np.clip(i - padding, 0, size - 2 * padding - 1)
+    return i + offsets[:, np.newaxis]
+
+
+def _cutout_crop_pad_flip_gather(array, cutout_min, cutout_size, crop_offsets, padding, flips):
+    nb_samples = array.shape[0]
+    nb_dims = len(array.shape) - 1
+
+    # for each dimension, the source index of each output index, shaped
+    # so that it broadcasts along the other dimensions
+    index = [np.arange(nb_samples).reshape([nb_samples] + [1] * nb_dims)]
+    mask = np.ones([nb_samples] + [1] * nb_dims, dtype=bool)
+    for dim, size in enumerate(array.shape[1:]):
+        i = _source_indices(size, padding[dim], crop_offsets[:, dim], flips[:, dim])
+        i = i.reshape([nb_samples] + [1] * dim + [size] + [1] * (nb_dims - dim - 1))
+        cutout_start = cutout_min[:, dim].reshape([nb_samples] + [1] * nb_dims)
+        mask = mask & (i >= cutout_start) & (i < cutout_start + cutout_size[dim])
+        index.append(i)
+
+    if isinstance(array, torch.Tensor):
+        output = array[tuple(torch.from_numpy(i).to(array.device) for i in index)]
+        output[torch.from_numpy(mask).to(array.device)] = 0
+    else:
+        output = array[tuple(index)]
+        output[mask] = 0
+    return output
+
+
+if numba is not None:
+    @numba.njit(inline='always')
+    def _source_index(i, size, padding, offset, flip):
+        if flip:
+            i = size - 1 - i
+        i = min(max(i - padding, 0), size - 2 * padding - 1)
+        return i + offset
+
+    @numba.njit(parallel=True)
+    def _cutout_crop_pad_flip_4d_kernel(array, cutout_min, cutout_size, crop_offsets, padding, flips, output):
+        for n in numba.prange(output.shape[0]):
+            for i0 in range(output.shape[1]):
+                s0 = _source_index(i0, output.shape[1], padding[0], crop_offsets[n, 0], flips[n, 0])
+                inside0 = cutout_min[n, 0] <= s0 < cutout_min[n, 0] + cutout_size[0]
+                for i1 in range(output.shape[2]):
+                    s1 = _source_index(i1, output.shape[2], padding[1], crop_offsets[n, 1], flips[n, 1])
+                    inside1 = inside0 and cutout_min[n, 1] <= s1 < cutout_min[n, 1] + cutout_size[1]
+                    for i2 in range(output.shape[3]):
+                        s2 = _source_index(i2, output.shape[3], padding[2], crop_offsets[n, 2], flips[n, 2])
+                        if inside1 and cutout_min[n, 2] <= s2 < cutout_min[n, 2] + cutout_size[2]:
+                            output[n, i0, i1, i2] = 0
+                        else:
+                            output[n, i0, i1, i2] = array[n, s0, s1, s2]
+else:
+    _cutout_crop_pad_flip_4d_kernel = None
+
+
+# torch types that can be viewed as numpy arrays supported by the numba kernel
+_KERNEL_TORCH_DTYPES = (
+    torch.bool, torch.uint8, torch.int8, torch.int16, torch.int32, torch.int64, torch.float32, torch.float64)
+
+
+def _kernel_supports(array: TensorNCX) -> bool:
+    """
+    Return `True` if `array` can be transformed by the compiled numba kernel
+    """
+    if numba is None or len(array.shape) != 4:
+        return False
+    if isinstance(array, torch.Tensor):
+        # `requires_grad` tensors can't be viewed as numpy arrays
+        return array.device.type == 'cpu' and not array.requires_grad and array.dtype in _KERNEL_TORCH_DTYPES
+    return numba_kernel_supports(array.dtype)
+
+
+def _cutout_crop_pad_flip_4d_numba(array, cutout_min, cutout_size, crop_offsets, padding, flips):
+    """
+    Transform the samples in parallel using the compiled kernel
+
+    Returns:
+        the transformed array or `None` if the kernel could not be run
+    """
+    if isinstance(array, torch.Tensor):
+        output = torch.empty_like(array, memory_format=torch.contiguous_format)
+        array_numpy, output_numpy = array.numpy(), output.numpy()
+    else:
+        output = np.empty_like(array)
+        array_numpy, output_numpy = array, output
+
+    try:
+        _cutout_crop_pad_flip_4d_kernel(
+            array_numpy, cutout_min, cutout_size, crop_offsets, padding, flips, output_numpy)
+    except NUMBA_KERNEL_ERRORS as e:
+        warnings.warn(f'numba cutout crop pad flip kernel failed, falling back to the gather. Exception={e}')
+        return None
+    return output
+
+
+def transform_batch_random_cutout_crop_pad_flip(
+        array: TensorNCX,
+        cutout_size: ShapeCX,
+        padding: ShapeCX,
+        flip_axis: int,
+        flip_probability: float = 0.5) -> TensorNCX:
+    """
+    Randomly cutout, edge pad & crop and flip the samples of an array in a single pass
+
+    This is equivalent to the successive application of :class:`trw.transforms.TransformRandomCutout` (cutout
+    value of 0), :class:`trw.transforms.TransformRandomCropPad` (`edge` mode) and
+    :class:`trw.transforms.TransformRandomFlip` but without the intermediate arrays. If `numba` is installed,
+    4D numpy arrays and CPU tensors (e.g., NCHW) of a supported type (see
+    :func:`trw.transforms.crop.numba_kernel_supports`) are transformed in parallel using a compiled kernel
+
+    Args:
+        array: a numpy or Torch array. Samples are stored in the first dimension
+        cutout_size: the size of the region to occlude (with ``N`` dimension removed)
+        padding: a sequence of size `len(array.shape)-1` indicating the width of the padding
+        flip_axis: the axis to flip
+        flip_probability: the probability that a sample is flipped
+
+    Returns:
+        a transformed array with the same shape as `array`
+    """
+    assert isinstance(array, (np.ndarray, torch.Tensor)), 'must be a numpy array or pytorch.Tensor!'
+    for s, p in zip(array.shape[1:], padding):
+        assert s > 2 * p, f'padding is too large for shape={array.shape[1:]}, padding={padding}'
+
+    cutout_min, crop_offsets, flips = _random_parameters(
+        array.shape, cutout_size, padding, flip_axis, flip_probability)
+    cutout_size = np.asarray(cutout_size, dtype=np.int64)
+    padding = np.asarray(padding, dtype=np.int64)
+
+    args = cutout_min, cutout_size, crop_offsets, padding, flips
+    if _kernel_supports(array):
+        # numba is available: transform the samples in parallel using a compiled kernel
+        output = _cutout_crop_pad_flip_4d_numba(array, *args)
+        if output is not None:
+            return output
+
+    return _cutout_crop_pad_flip_gather(array, *args)
+
+
+def _transform_random_cutout_crop_pad_flip(feature_names, batch, cutout_size, padding, flip_axis, flip_probability):
+    assert len(feature_names) == 1, 'joint CUTOUT is not yet implemented!'
+
+    new_batch = collections.OrderedDict()
+    new_batch[feature_names[0]] = transform_batch_random_cutout_crop_pad_flip(
+        batch[feature_names[0]],
+        cutout_size=cutout_size,
+        padding=padding,
+        flip_axis=flip_axis,
+        flip_probability=flip_probability)
+
+    for feature_name, feature_value in batch.items():
+        if feature_name not in feature_names:
+            # not in the transformed features, so copy the original value
+            new_batch[feature_name] = feature_value
+    return new_batch
+
+
+class TransformRandomCutoutCropPadFlip(transforms.TransformBatchWithCriteria):
+    """
+    Randomly cutout, pad & crop and flip the selected feature in a single pass (e.g., the
+    typical CIFAR10 data augmentation)
+
+    Args:
+        cutout_size: the size of the region to occlude (with ``N`` dimension removed)
+        padding: a sequence of size `len(array.shape)-1` indicating the width of the
+            padding to be added at the beginning and at the end of each dimension (except for dimension 0)
+        flip_axis: the axis to flip
+        flip_probability: the probability that a sample is flipped
+        criteria_fn: function applied on each feature. If satisfied, the feature will be transformed, if not
+            the original feature is returned
+    """
+    def __init__(
+            self,
+            cutout_size: ShapeCX,
+            padding: ShapeCX,
+            flip_axis: int,
+            flip_probability: float = 0.5,
+            criteria_fn: Optional[Callable[[Batch], List[str]]] = None):
+
+        assert isinstance(cutout_size, tuple), 'must be a tuple!'
+        if criteria_fn is None:
+            criteria_fn = transforms.criteria_is_array_4_or_above
+
+        super().__init__(
+            criteria_fn=criteria_fn,
+            transform_fn=functools.partial(
+                _transform_random_cutout_crop_pad_flip,
+                cutout_size=cutout_size,
+                padding=padding,
+                flip_axis=flip_axis,
+                flip_probability=flip_probability)
+        )
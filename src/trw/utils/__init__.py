@@ -75,7 +75,30 @@ def collect_hierarchical_parameter_name(base_name, model, parameter_to_name=None
     return parameter_to_name
 
 
-def get_batch_n(split, nb_samples, indices, transforms, use_advanced_indexing):
+def _take_into_buffer(array, indices, batch_buffers, name):
+    """
+    Gather the ``indices`` of ``array`` into the buffer ``batch_buffers[name]``. The buffer is allocated
+    for the largest number of indices seen and a view of the first ``len(indices)`` rows is returned
+    """
+    indices = np.asarray(indices)
+    if len(indices) > 0 and (indices.min() < 0 or indices.max() >= len(array)):
+        # negative or out of range indices: let numpy handle them (e.g., raise `IndexError`)
+        return np.take(array, indices, axis=0)
+
+    buffer = batch_buffers.get(name)
+    if buffer is None or len(buffer) < len(indices) or buffer.shape[1:] != array.shape[1:] or \
+            buffer.dtype != array.dtype:
+        buffer = np.empty((len(indices),) + array.shape[1:], dtype=array.dtype)
+        batch_buffers[name] = buffer
+    buffer = buffer[:len(indices)]
+
+    # `mode='clip'` (the indices were checked): with the default `mode='raise'`,
+    # numpy gathers in a temporary array first then copy the result to the buffer
+    np.take(array, indices, axis=0, out=buffer, mode='clip')
+    return buffer
+
+
+def get_batch_n(split, nb_samples, indices, transforms, use_advanced_indexing, batch_buffers=None):
     """
     Collect the split indices given and apply a series of transformations
 
@@ -88,6 +111,9 @@ def get_batch_n(split, nb_samples, indices, transforms, use_advanced_indexing):
             use a simple list (original data is referenced)
             advanced indexing is typically faster for small objects, however for large objects (e.g., 3D data)
             the advanced indexing makes a copy of the data making it very slow.
+        batch_buffers: if not None, a dictionary of `np.ndarray` buffers (allocated for the largest
+            batch seen) where the `np.ndarray` of the split will be gathered when `use_advanced_indexing`
+            is True. The returned split references these buffers
 
     Returns:
         a split with the indices provided
@@ -99,7 +125,10 @@ def get_batch_n(split, nb_samples, indices, transforms, use_advanced_indexing):
             # this is because split_data[indices] will make a deep copy of the data which may be time consuming
             # for large data
             if use_advanced_indexing:
-                split_data = split_data[indices]
+                if batch_buffers is not None and isinstance(split_data, np.ndarray):
+                    split_data = _take_into_buffer(split_data, indices, batch_buffers, split_name)
+                else:
+                    split_data = split_data[indices]
             else:
                 split_data = [[split_data[i]] for i in indices]
         if isinstance(split_data, list) and len(split_data) == nb_samples:
@@ -212,7 +241,7 @@ def len_batch(batch):
 
 def flatten_nested_dictionaries(d, root_name='', delimiter='-'):
     """
-    Recursively flatten a dictionary of arbitrary nested size into a flattened dictionary
+    Flatten a dictionary of arbitrary nested size into a flattened dictionary
     of nested size 1
 
     Args:
@@ -225,15 +254,19 @@ def flatten_nested_dictionaries(d, root_name='', delimiter='-'):
     """
     assert isinstance(d, collections.Mapping)
     flattened = collections.OrderedDict()
-    for name, value in d.items():
-        if len(root_name) == 0:
+
+    # explicit stack of (full name, value). Items are pushed in reverse order
+    # so that the flattened dictionary follows the ordering of `d`
+    stack = [(name, value, root_name) for name, value in reversed(list(d.items()))]
+    while len(stack) > 0:
+        name, value, parent_name = stack.pop()
+        if len(parent_name) == 0:
             full_name = name
         else:
-            full_name = f'{root_name}{delimiter}{name}'
+            full_name = f'{parent_name}{delimiter}{name}'
 
         if isinstance(value, collections.Mapping):
-            sub_flattened = flatten_nested_dictionaries(value, root_name=full_name)
-            flattened.update(sub_flattened)
+            stack.extend((sub_name, sub_value, full_name) for sub_name, sub_value in reversed(list(value.items())))
         else:
             flattened[full_name] = value
     return flattened
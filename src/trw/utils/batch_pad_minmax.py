@@ -6,6 +6,14 @@ import torch.nn.functional as F
 from trw.basic_typing import NumpyTensorNCX, ShapeCX, TorchTensorNCX, TensorNCX, Numeric
 
 
+# `numpy.pad` modes and their corresponding `torch.nn.functional.pad` modes
+_NUMPY_TO_TORCH_PAD_MODE = {
+    'constant': 'constant',
+    'edge': 'replicate',
+    'symmetric': 'reflect',
+}
+
+
 def batch_pad_minmax_numpy(
         array: NumpyTensorNCX,
         padding_min: ShapeCX,
@@ -35,8 +43,12 @@ def batch_pad_minmax_numpy(
     full_padding = list(zip(full_padding_min, full_padding_max))
 
     if mode == 'constant':
-        constant_values = [(constant_value, constant_value)] * len(array.shape)
-        padded_array = np.pad(array, full_padding, mode='constant', constant_values=constant_values)
+        # allocate the padded array filled with the constant and copy the original
+        # array in the center. This is faster than `np.pad` which uses intermediate arrays
+        padded_shape = [s + p_min + p_max for s, (p_min, p_max) in zip(array.shape, full_padding)]
+        padded_array = np.full(padded_shape, constant_value, dtype=array.dtype)
+        center = tuple(slice(p_min, p_min + s) for s, (p_min, _) in zip(array.shape, full_padding))
+        padded_array[center] = array
     else:
         padded_array = np.pad(array, full_padding, mode=mode)
     return padded_array
@@ -75,13 +87,13 @@ def batch_pad_minmax_torch(
         full_padding.append(p_min)
         full_padding.append(p_max)
 
-    if mode == 'edge':
-        mode = 'replicate'
-    if mode == 'symmetric':
-        mode = 'reflect'
+    assert mode in _NUMPY_TO_TORCH_PAD_MODE, f'unsupported padding mode={mode}'
+    mode = _NUMPY_TO_TORCH_PAD_MODE[mode]
 
     if mode != 'constant':
         # for reflect and replicate we MUST remove the `component` padding
+        assert padding_min[0] == 0 and padding_max[0] == 0, \
+            f'mode={mode} does not support padding of the component dimension!'
         full_padding = full_padding[:-2]
 
     if mode == 'constant':
@@ -2,6 +2,20 @@ from typing import Sequence, Any
 import torch
 
 
+def _clamp_supports_tensor_bounds() -> bool:
+    """
+    Tensor bounds for `torch.clamp` are only supported from pytorch 1.9
+    """
+    try:
+        torch.clamp(torch.zeros(1), min=torch.zeros(1), max=torch.ones(1))
+        return True
+    except TypeError:
+        return False
+
+
+_CLAMP_TENSOR_BOUNDS = _clamp_supports_tensor_bounds()
+
+
 def clamp_n(tensor: torch.Tensor, min_values: Sequence[Any], max_values: Sequence[Any]) -> torch.Tensor:
     """
     Clamp a tensor with axis dependent values.
@@ -29,4 +43,8 @@ def clamp_n(tensor: torch.Tensor, min_values: Sequence[Any], max_values: Sequenc
     else:
         assert min_values.shape[0] == 1, 'must be broadcastable to tensor shape'
         assert max_values.shape[0] == 1, 'must be broadcastable to tensor shape'
+
+    if _CLAMP_TENSOR_BOUNDS:
+        # single kernel instead of a `min` followed by a `max`
+        return torch.clamp(tensor, min=min_values, max=max_values)
     return torch.max(torch.min(tensor, max_values), min_values)
@@ -1,7 +1,19 @@
-import torch.nn.functional as F
+import torch
 from trw.basic_typing import TorchTensorNCX
 
 
+def _amax(tensor: TorchTensorNCX, dim) -> TorchTensorNCX:
+    """
+    Max reduction over the dimensions ``dim``.
+
+    ``torch.amax`` doesn't calculate the indices of the max values but it is only available
+    from pytorch 1.7. For older versions, the spatial dimensions are flattened to a single dimension.
+    """
+    if hasattr(torch, 'amax'):
+        return torch.amax(tensor, dim=dim)
+    return tensor.flatten(dim[0]).max(dim=dim[0])[0]
+
+
 def global_max_pooling_2d(tensor: TorchTensorNCX) -> TorchTensorNCX:
     """
     2D Global max pooling.
@@ -15,7 +27,7 @@ def global_max_pooling_2d(tensor: TorchTensorNCX) -> TorchTensorNCX:
         a tensor of shape NC
     """
     assert len(tensor.shape) == 4, 'must be a NCHW tensor!'
-    return F.max_pool2d(tensor, tensor.shape[2:]).squeeze(2).squeeze(2)
+    return _amax(tensor, dim=(2, 3))
 
 
 def global_average_pooling_2d(tensor: TorchTensorNCX) -> TorchTensorNCX:
@@ -31,7 +43,7 @@ def global_average_pooling_2d(tensor: TorchTensorNCX) -> TorchTensorNCX:
         a tensor of shape NC
     """
     assert len(tensor.shape) == 4, 'must be a NCHW tensor!'
-    return F.avg_pool2d(tensor, tensor.shape[2:]).squeeze(2).squeeze(2)
+    return tensor.mean(dim=(2, 3))
 
 
 def global_max_pooling_3d(tensor: TorchTensorNCX) -> TorchTensorNCX:
@@ -47,7 +59,7 @@ def global_max_pooling_3d(tensor: TorchTensorNCX) -> TorchTensorNCX:
         a tensor of shape NC
     """
     assert len(tensor.shape) == 5, 'must be a NCDHW tensor!'
-    return F.max_pool3d(tensor, tensor.shape[2:]).squeeze(2).squeeze(2).squeeze(2)
+    return _amax(tensor, dim=(2, 3, 4))
 
 
 def global_average_pooling_3d(tensor: TorchTensorNCX) -> TorchTensorNCX:
@@ -63,4 +75,4 @@ def global_average_pooling_3d(tensor: TorchTensorNCX) -> TorchTensorNCX:
         a tensor of shape NC
     """
     assert len(tensor.shape) == 5, 'must be a NCDHW tensor!'
-    return F.avg_pool3d(tensor, tensor.shape[2:]).squeeze(2).squeeze(2).squeeze(2)
+    return tensor.mean(dim=(2, 3, 4))
@@ -1,3 +1,4 @@
+import functools
 import importlib
 
 
@@ -12,12 +13,16 @@ class _LazyRaise:
         raise RuntimeError(self.msg)
 
 
+@functools.lru_cache(maxsize=None)
 def optional_import(module_name: str):
     """
     Optional module import.
 
     Raise an error only when a module is being used
 
+    The result of the import (module or missing module placeholder) is cached. Use
+    `optional_import.cache_clear()` to retry the imports (e.g., after `sys.path` is modified).
+
     Args:
         module_name: the name of the module to import
 
@@ -1,3 +1,15 @@
+import functools
+
+
+# characters to be replaced in a filename
+_UNSAFE_CHARACTERS = '/\\#'
+
+
+@functools.lru_cache(maxsize=None)
+def _translation_table(replace_with: str):
+    return str.maketrans({c: replace_with for c in _UNSAFE_CHARACTERS})
+
+
 def safe_filename(filename: str, replace_with: str = '_') -> str:
     """
     Replace problematic characters (e.g., '/' or '#') considering Windows/Linux based OSes
@@ -8,4 +20,4 @@ def safe_filename(filename: str, replace_with: str = '_') -> str:
     Returns:
         a string that can be used as filename
     """
-    return filename.replace('/', replace_with).replace('\\', replace_with).replace('#', replace_with)
+    return filename.translate(_translation_table(replace_with))
@@ -8,7 +8,20 @@ from unittest import TestCase
 from trw.layers import default_layer_config, AutoencoderConvolutionalVariationalConditional, EncoderDecoderResnet
 from trw.layers.autoencoder_convolutional_variational import AutoencoderConvolutionalVariational
 from trw.layers.blocks import BlockRes, BlockConvNormActivation
-from trw.train import one_hot
+from torch.nn.functional import one_hot as one_hot_f
+
+
+@torch.jit.script
+def concatenate_latent_digits(latent: torch.Tensor, digits: torch.Tensor, nb_digits: int) -> torch.Tensor:
+    digits_one_hot = torch.nn.functional.one_hot(digits, nb_digits).to(latent.dtype).unsqueeze(2).unsqueeze(3)
+    return torch.cat((digits_one_hot, latent), dim=1)
+
+
+@torch.jit.script
+def concatenate_image_digits(image: torch.Tensor, digits: torch.Tensor, nb_digits: int) -> torch.Tensor:
+    digits_one_hot = torch.nn.functional.one_hot(digits, nb_digits).to(image.dtype).unsqueeze(2).unsqueeze(3)
+    image_class = digits_one_hot.expand(-1, -1, image.shape[2], image.shape[3])
+    return torch.cat((image, image_class), dim=1)
 
 
 class ConditionalGenerator(nn.Module):
@@ -16,13 +29,13 @@ class ConditionalGenerator(nn.Module):
         super(ConditionalGenerator, self).__init__()
 
         self.nb_digits = nb_digits
-        self.convs_t = trw.layers_legacy.ConvsTransposeBase(
+        self.convs_t = trw.layers.ConvsTransposeBase(
             2,
             input_channels=latent_size + nb_digits,
             channels=[1024, 512, 256, 1],
             convolution_kernels=4,
             strides=[1, 2, 2, 2],
-            batch_norm_kwargs={},
+            norm_type=trw.layers.NormType.BatchNorm,
             paddings=[0, 1, 1, 1],
             activation=functools.partial(nn.LeakyReLU, negative_slope=0.2),
             squash_function=torch.tanh,
@@ -32,8 +45,7 @@ class ConditionalGenerator(nn.Module):
     def forward(self, latent, digits):
         assert len(digits.shape) == 1
 
-        digits_one_hot = one_hot(digits, self.nb_digits).unsqueeze(2).unsqueeze(3)
-        full_latent = torch.cat((digits_one_hot, latent), dim=1)
+        full_latent = concatenate_latent_digits(latent, digits, self.nb_digits)
         x = self.convs_t(full_latent)
         return x
 
@@ -43,12 +55,12 @@ class ConditionalDiscriminator(nn.Module):
         super(ConditionalDiscriminator, self).__init__()
 
         self.nb_digits = nb_digits
-        self.convs = trw.layers_legacy.convs_2d(
+        self.convs = trw.layers.convs_2d(
             1 + nb_digits,
             [64, 128, 256, 2],
             convolution_kernels=[4, 4, 4, 3],
             strides=[2, 4, 4, 2],
-            batch_norm_kwargs={},
+            norm_type=trw.layers.NormType.BatchNorm,
             pooling_size=None,
             with_flatten=True,
             activation=functools.partial(nn.LeakyReLU, negative_slope=0.2),
@@ -56,10 +68,7 @@ class ConditionalDiscriminator(nn.Module):
         )
 
     def forward(self, input, digits):
-        input_class = torch.ones(
-            [digits.shape[0], self.nb_digits, input.shape[2], input.shape[3]],
-            device=input.device) * one_hot(digits, 10).unsqueeze(2).unsqueeze(3)
-        x = self.convs(torch.cat((input, input_class), dim=1))
+        x = self.convs(concatenate_image_digits(input, digits, self.nb_digits))
         return x
 
 
@@ -258,6 +267,32 @@ class TestLayers2(TestCase):
         children_22 = net.layers[2][2].op
         assert isinstance(children_22, nn.MaxPool3d)
 
+        #
+        # Forward using the channels last (NDHWC) memory format
+        #
+        if hasattr(torch, 'channels_last_3d'):
+            net = net.to(memory_format=torch.channels_last_3d)
+            i = torch.zeros([5, 2, 64, 64, 64]).to(memory_format=torch.channels_last_3d)
+            intermediates = net.forward_with_intermediate(i)
+            assert len(intermediates) == 3
+            assert intermediates[-1].shape == (5, 10, 1, 1, 1)
+
+            # the memory format must be preserved by the convolutions. Check on outputs with a spatial
+            # size > 1 (with a 1x1x1 spatial size, any memory format is contiguous)
+            first_conv = net.layers[0][0].ops[0](i)
+            assert first_conv.shape == (5, 4, 64, 64, 64)
+            assert first_conv.is_contiguous(memory_format=torch.channels_last_3d)
+            assert not first_conv.is_contiguous()
+
+            # the last convolution block has no normalization layer
+            last_conv = net.layers[2][1](net.layers[2][0](intermediates[1]))
+            assert last_conv.shape == (5, 10, 2, 2, 2)
+            assert last_conv.is_contiguous(memory_format=torch.channels_last_3d)
+            assert not last_conv.is_contiguous()
+
+            o = net(i)
+            assert o.shape == (5, 10)
+
     def test_deconv_block(self):
         conf = trw.layers.default_layer_config(2)
         block = trw.layers.BlockDeconvNormActivation(conf, 1, 8, kernel_size=(5, 5))
@@ -427,7 +462,7 @@ class TestLayers2(TestCase):
             squash_function=torch.sigmoid,
         )
 
-        x = torch.randn([10, 1, 28, 28], dtype=torch.float32)
+        x = torch.rand([10, 1, 28, 28], dtype=torch.float32)
         model = AutoencoderConvolutionalVariational([1, 1, 28, 28], encoder, decoder, z_size)
         recon, mu, logvar = model(x)
 
@@ -435,11 +470,16 @@ class TestLayers2(TestCase):
         assert mu.shape == (10, 20)
         assert mu.shape == logvar.shape
 
-        loss_bce = AutoencoderConvolutionalVariational.loss_function(recon, x, mu, logvar, recon_loss_name='BCE')
+        loss_bce, loss_mse = AutoencoderConvolutionalVariational.loss_function_multi(
+            recon, x, mu, logvar, recon_loss_names=('BCE', 'MSE'))
         assert loss_bce.shape == (10,)
-        loss_mse = AutoencoderConvolutionalVariational.loss_function(recon, x, mu, logvar, recon_loss_name='MSE')
         assert loss_mse.shape == (10,)
 
+        # compare with the losses calculated one by one on a single sample
+        expected_loss_bce = AutoencoderConvolutionalVariational.loss_function(
+            recon[:1], x[:1], mu[:1], logvar[:1], recon_loss_name='BCE')
+        assert torch.allclose(loss_bce[:1], expected_loss_bce)
+
     def test_autoencoder_conv_var_conditional(self):
         z_size = 20
         y_size = 5
@@ -462,7 +502,7 @@ class TestLayers2(TestCase):
             squash_function=torch.sigmoid,
         )
 
-        y = one_hot(torch.tensor([0] * 10, dtype=torch.long), y_size)
+        y = one_hot_f(torch.tensor([0] * 10, dtype=torch.long), y_size).to(torch.float32)
         x = torch.randn([10, 1, 28, 28], dtype=torch.float32)
         model = AutoencoderConvolutionalVariationalConditional([1, 1, 28, 28], encoder, decoder, z_size, y_size=y_size)
         recon, mu, logvar = model(x, y)
@@ -471,6 +511,30 @@ class TestLayers2(TestCase):
         assert mu.shape == (10, z_size)
         assert mu.shape == logvar.shape
 
+    def test_conditional_gan(self):
+        latent_size = 16
+        digits = torch.tensor([0, 1, 2, 9], dtype=torch.long)
+        latent = torch.randn([4, latent_size, 1, 1], dtype=torch.float32)
+
+        full_latent = concatenate_latent_digits(latent, digits, 10)
+        assert full_latent.shape == (4, 10 + latent_size, 1, 1)
+        assert (full_latent[:, :10, 0, 0] == one_hot_f(digits, 10).float()).all()
+        assert (full_latent[:, 10:] == latent).all()
+
+        generator = ConditionalGenerator(latent_size)
+        images = generator(latent, digits)
+        assert images.shape == (4, 1, 28, 28)
+
+        images_digits = concatenate_image_digits(images, digits, 10)
+        assert images_digits.shape == (4, 1 + 10, 28, 28)
+        assert (images_digits[:, 0] == images[:, 0]).all()
+        assert (images_digits[3, 10] == 1).all()
+        assert (images_digits[3, 1:10] == 0).all()
+
+        discriminator = ConditionalDiscriminator()
+        o = discriminator(images, digits)
+        assert o.shape == (4, 2)
+
     def test_layer_res(self):
         config = default_layer_config(dimensionality=2)
         b = BlockRes(config, 8, kernel_size=7, padding='same', padding_mode='reflect')
@@ -98,3 +98,24 @@ class TestUNet(TestCase):
                 assert o.shape[0] == i.shape[0]
                 assert o.shape[1] == 2
                 assert o.shape[2:] == i.shape[2:]
+
+    def test_unet_gradient_checkpointing(self):
+        torch.manual_seed(0)
+        model = trw.layers.UNetBase(2, input_channels=1, output_channels=2, channels=[8, 16])
+        model_checkpointed = trw.layers.UNetBase(
+            2, input_channels=1, output_channels=2, channels=[8, 16], gradient_checkpointing=True)
+        model_checkpointed.load_state_dict(model.state_dict())
+
+        i = torch.randn([4, 1, 32, 32])
+        for m in (model, model_checkpointed):
+            m.train()
+            m(i).square().sum().backward()
+
+        # the activations are recalculated: same gradients
+        for p, p_checkpointed in zip(model.parameters(), model_checkpointed.parameters()):
+            assert torch.allclose(p.grad, p_checkpointed.grad, atol=1e-5)
+
+        # no checkpointing in eval mode
+        model_checkpointed.eval()
+        with torch.no_grad():
+            assert torch.allclose(model.eval()(i), model_checkpointed(i), atol=1e-5)
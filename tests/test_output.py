@@ -6,11 +6,22 @@ import numpy as np
 import torch
 import functools
 import torch.nn as nn
+import torch.nn.functional as F
 import trw.utils
 from trw.train import segmentation_criteria_ce_dice
 
 
 class TestOutput(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # segmentation scores shared by the segmentation tests: 10 samples, 4 classes, 2D 32x32 grid.
+        # Tests modifying the scores must work on a copy
+        cls._seg_mask = torch.zeros(10, 4, 32, 32, dtype=torch.float32)
+        cls._seg_mask[:, 1].fill_(100.0)
+
+        # per-voxel weight mask of shape (10, 1, 32, 40) with the region [4:21, 8:38] set to 1
+        cls._seg_weight_mask = F.pad(torch.ones(10, 1, 17, 30, dtype=torch.float32), [8, 2, 4, 11])
+
     def test_regression_0_loss(self):
         input_values = torch.from_numpy(np.asarray([[1, 2], [3, 4]], dtype=float))
         target_values = torch.from_numpy(np.asarray([[1, 2], [3, 4]], dtype=float))
@@ -89,8 +100,7 @@ class TestOutput(TestCase):
         self.assertTrue(loss < 1e-6)
 
     def test_output_segmentation(self):
-        mask_scores = torch.zeros(10, 4, 32, 32, dtype=torch.float32)  # 10 samples, 4 classes, 2D 32x32 grid
-        mask_scores[:, 1, :, :] = 100.0
+        mask_scores = self._seg_mask
         expected_map = torch.ones(10, 1, 32, 32, dtype=torch.int64)
 
         o = trw.train.OutputSegmentation2(
@@ -102,19 +112,20 @@ class TestOutput(TestCase):
             'target': expected_map,
         }
         loss_term = o.evaluate_batch(batch, is_training=False)
-        assert trw.utils.to_value(loss_term['loss']) < 1e-5
-        assert (trw.utils.to_value(loss_term['output']) == 1).all()
+        loss = loss_term['loss'].detach()
+        torch.testing.assert_close(loss, torch.zeros((), device=loss.device), atol=1e-5, rtol=0)
+        output = loss_term['output'].to(torch.int64)
+        torch.testing.assert_close(output, torch.ones_like(output))
 
     def test_output_segmentation_weight(self):
         """
         Make sure the loss can be weighted with a per-voxel mask
         """
-        torch.manual_seed(0)
-        mask_scores = torch.randn([10, 4, 32, 40], dtype=torch.float32)  # 10 samples, 4 classes, 2D 32x32 grid
+        generator = torch.Generator().manual_seed(0)
+        mask_scores = torch.empty([10, 4, 32, 40], dtype=torch.float32).normal_(generator=generator)  # 10 samples, 4 classes, 2D 32x40 grid
         expected_map = torch.ones(10, 1, 32, 40, dtype=torch.int64)
 
-        mask_weight = torch.zeros_like(expected_map, dtype=torch.float32)
-        mask_weight[:, :, 4:21, 8:38] = 1
+        mask_weight = self._seg_weight_mask
 
         def loss(found, expected, per_voxel_weights):
             l = mask_weight.view(10, 1, 32, 40) * found
@@ -134,7 +145,7 @@ class TestOutput(TestCase):
         expected_loss = mask_scores[:, :, 4:21, 8:38].sum([1, 2, 3])
 
         losses = loss_term['losses']
-        assert torch.max(torch.abs(losses - expected_loss)) < 1e-3
+        torch.testing.assert_close(losses, expected_loss, atol=1e-3, rtol=0)
 
         # make sure we support per_voxel_weights arguments
         o = trw.train.OutputSegmentation2(
@@ -143,7 +154,8 @@ class TestOutput(TestCase):
             per_voxel_weights=torch.zeros_like(expected_map, dtype=torch.float32),
             criterion_fn=lambda: functools.partial(segmentation_criteria_ce_dice, ce_weight=1.0))
         loss_term = o.evaluate_batch(batch, is_training=False)
-        assert loss_term['loss'].item() == 0.0
+        loss = loss_term['loss'].detach()
+        torch.testing.assert_close(loss, torch.zeros((), device=loss.device), atol=0, rtol=0)
 
     def test_output_triplets(self):
         samples = torch.tensor(
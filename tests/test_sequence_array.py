@@ -146,3 +146,62 @@ class TestSequenceArray(TestCase):
         # we resampled the sequence to 10 samples with a batch size of 5
         # so we expect 2 batches
         self.assertTrue(len(batches) == 2)
+
+    def test_augment_workers(self):
+        nb_indices = 40
+        split = {
+            'uid': np.asarray(list(range(nb_indices))),
+            'values': np.asarray(list(range(nb_indices))),
+        }
+
+        sequence = trw.train.SequenceArray(
+            split,
+            sampler=trw.train.SamplerSequential(batch_size=5),
+            transforms=double_values,
+            nb_augment_workers=2)
+
+        for epoch in range(2):
+            uids = []
+            for batch in sequence:
+                assert (batch['uid'] * 2.0 == batch['values']).all()
+                uids += list(batch['uid'])
+
+            # the ordering is not guaranteed but we must have all the samples
+            assert sorted(uids) == list(range(nb_indices))
+
+        sequence.close()
+
+    def test_reuse_batch_buffers(self):
+        nb_indices = 23
+        split = {
+            'values': np.arange(nb_indices * 2).reshape((nb_indices, 2)).astype(np.float32),
+            'list': list(range(nb_indices)),
+        }
+
+        sequence = trw.train.SequenceArray(
+            split,
+            sampler=trw.train.SamplerRandom(batch_size=5),
+            reuse_batch_buffers=True)
+
+        buffers = set()
+        nb_samples = 0
+        for batch in sequence:
+            assert isinstance(batch['values'], np.ndarray)
+            assert (batch['values'][:, 0] == batch['sample_uid'] * 2).all()
+            assert (batch['values'][:, 0] == np.asarray(batch['list']) * 2).all()
+            buffers.add(id(batch['values'].base))
+            nb_samples += len(batch['values'])
+
+        assert nb_samples == nb_indices
+        # all the batches share the same buffer, including the last (incomplete) batch
+        assert len(buffers) == 1
+
+    def test_reuse_batch_buffers_invalid_indices(self):
+        split = {'values': np.arange(10).astype(np.float32)}
+        batch_buffers = {}
+
+        with self.assertRaises(IndexError):
+            trw.utils.get_batch_n(split, 10, np.asarray([0, 10]), None, True, batch_buffers=batch_buffers)
+
+        batch = trw.utils.get_batch_n(split, 10, np.asarray([-1, 2]), None, True, batch_buffers=batch_buffers)
+        assert (batch['values'] == [9, 2]).all()
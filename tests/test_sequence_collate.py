@@ -33,3 +33,17 @@ class TestSequenceCollate(TestCase):
 
         for batch in sequence:
             assert trw.utils.len_batch(batch) == 10
+
+    def test_collate_pin_memory(self):
+        nb_indices = 20
+        split = {'values': np.arange(nb_indices, dtype=np.float32)}
+        sampler = trw.train.SamplerSequential(batch_size=5)
+        sequence = trw.train.SequenceArray(split, sampler=sampler).collate(pin_memory=True)
+
+        values = []
+        for batch in sequence:
+            assert isinstance(batch['values'], torch.Tensor)
+            # memory can only be pinned if CUDA is available
+            assert batch['values'].is_pinned() == torch.cuda.is_available()
+            values += list(batch['values'].numpy())
+        assert values == list(range(nb_indices))
@@ -254,3 +254,155 @@ class TestTrainer(TestCase):
         coef_found = trw.utils.to_value(list(model.model.parameters())[0])
         print(coef_found)
         self.assertAlmostEqual(coef_found, 2.0, delta=1e-3)
+
+    def test_gradient_clipping(self):
+        # the per batch loss terms callbacks are run after the backward pass
+        # so the gradients must have already been clipped
+        model = ModelSimpleRegression()
+        gradients = []
+
+        def callback_batch_loss_terms(dataset_name, split_name, batch, loss_terms):
+            gradients.append(model.w.grad.clone())
+
+        options = trw.train.create_default_options(num_epochs=2)
+        options['training_parameters']['gradient_clipping_value'] = 0.01
+        trainer = create_trainer(callback_per_batch_loss_terms=[callback_batch_loss_terms])
+        trainer.fit(
+            options,
+            inputs_fn=create_simple_regression,
+            model_fn=lambda _: model,
+            optimizers_fn=optimizer_fn)
+
+        assert len(gradients) > 0
+        for g in gradients:
+            assert g.abs().max() <= 0.01
+
+    def test_simple_regression_compiled(self):
+        options = trw.train.create_default_options(num_epochs=200)
+        options['workflow_options']['compile_model'] = True
+        trainer = create_trainer()
+        model, results = trainer.fit(
+            options,
+            inputs_fn=create_simple_regression,
+            model_fn=create_model,
+            optimizers_fn=optimizer_fn,
+            eval_every_X_epoch=2)
+
+        # the original model must be returned
+        assert isinstance(model, ModelSimpleRegression)
+        coef_found = trw.utils.to_value(list(model.parameters())[0])
+        self.assertAlmostEqual(coef_found, 2.0, delta=1e-3)
+
+    def test_simple_regression_mixed_precision(self):
+        if not hasattr(torch, 'autocast'):
+            return
+
+        options = trw.train.create_default_options(num_epochs=200, device=torch.device('cpu'))
+        options['training_parameters']['mixed_precision'] = torch.bfloat16
+        trainer = create_trainer()
+        model, results = trainer.fit(
+            options,
+            inputs_fn=create_simple_regression,
+            model_fn=create_model,
+            optimizers_fn=optimizer_fn,
+            eval_every_X_epoch=2)
+
+        coef_found = trw.utils.to_value(list(model.parameters())[0])
+        self.assertAlmostEqual(coef_found, 2.0, delta=1e-2)
+
+    def test_mixed_precision_eval_loop(self):
+        if not hasattr(torch, 'autocast'):
+            return
+
+        class ModelRecordAutocast(ModelSimpleRegression):
+            def __init__(self):
+                super().__init__()
+                self.matmul_types = []
+
+            def forward(self, batch):
+                # `matmul` is run in the mixed precision type by autocast
+                x = batch['input_1'].float()
+                self.matmul_types.append((self.training, torch.matmul(x, x.t()).dtype))
+                return super().forward(batch)
+
+        model = ModelRecordAutocast()
+        options = trw.train.create_default_options(num_epochs=2, device='cpu')
+        options['training_parameters']['mixed_precision'] = torch.bfloat16
+        trainer = trw.train.Trainer(
+            callbacks_pre_training_fn=None,
+            callbacks_per_epoch_fn=None,
+            callbacks_per_batch_loss_terms_fn=None,
+            callbacks_post_training_fn=None,
+            callbacks_per_batch_fn=None
+        )
+        trainer.fit(
+            options,
+            inputs_fn=create_simple_regression,
+            model_fn=lambda options: model,
+            optimizers_fn=optimizer_fn)
+
+        # both the train and eval loops are run with autocast
+        assert {training for training, _ in model.matmul_types} == {True, False}
+        assert all(dtype == torch.bfloat16 for _, dtype in model.matmul_types)
+
+        # the gradient scalers are not stored in the options (serialized with the results)
+        options['training_parameters']['mixed_precision'] = torch.float16
+        options['training_parameters']['num_epochs'] = 1
+        model, results = trainer.fit(
+            options,
+            inputs_fn=create_simple_regression,
+            model_fn=create_model,
+            optimizers_fn=optimizer_fn)
+        assert 'grad_scalers' not in results['options']['runtime']
+
+    def test_create_sgd_multi_tensor(self):
+        model = nn.Linear(2, 1)
+        optimizers, schedulers = trw.train.create_sgd_optimizers_scheduler_step_lr_fn(
+            datasets={'dataset_1': None}, model=model, learning_rate=0.1, step_size=10, gamma=0.1)
+        optimizer = optimizers['dataset_1']
+        assert isinstance(optimizer, torch.optim.SGD)
+        assert schedulers['dataset_1'] is not None
+        if 'foreach' in optimizer.defaults:
+            # CPU parameters: no fused kernel
+            assert optimizer.defaults['foreach']
+            assert not optimizer.defaults.get('fused')
+
+        weight = model.weight.detach().clone()
+        model(torch.ones([4, 2])).sum().backward()
+        optimizer.step()
+        assert not torch.equal(weight, model.weight)
+
+    def test_sgd_one_cycle_lr(self):
+        model = nn.Linear(2, 1)
+        optimizers, schedulers = trw.train.create_sgd_optimizers_scheduler_one_cycle_lr_fn(
+            datasets={'dataset_1': None}, model=model, learning_rate=0.5, nb_epochs=10)
+        optimizer = optimizers['dataset_1']
+        scheduler = schedulers['dataset_1']
+
+        learning_rates = []
+        for epoch in range(10):
+            learning_rates.append(optimizer.param_groups[0]['lr'])
+            optimizer.step()
+            scheduler.step()
+
+        # warmup up to the maximum learning rate then annealing
+        assert learning_rates[0] < 0.1
+        self.assertAlmostEqual(max(learning_rates), 0.5)
+        assert learning_rates[-1] < 0.01
+        assert optimizer.param_groups[0]['momentum'] == 0.9
+
+    def test_zero_grad_custom_optimizer(self):
+        class OptimizerNoSetToNone(torch.optim.SGD):
+            def zero_grad(self):
+                super().zero_grad(set_to_none=False)
+
+        model = nn.Linear(2, 1)
+        for optimizer_fn, expected_grad in ((torch.optim.SGD, None), (OptimizerNoSetToNone, 0)):
+            optimizer = optimizer_fn(model.parameters(), lr=0.1)
+            for _ in range(2):
+                model(torch.ones([4, 2])).sum().backward()
+                trw.train.trainer.zero_grad(optimizer)
+                if expected_grad is None:
+                    assert model.weight.grad is None
+                else:
+                    assert (model.weight.grad == expected_grad).all()
@@ -35,8 +35,10 @@ class ComposedModel(nn.ModuleDict):
         x_1 = self['dataset_1'](batch)
         x_2 = self['dataset_2'](batch)
 
-        w1 = trw.utils.to_value(self['dataset_1'].w)
-        w2 = trw.utils.to_value(self['dataset_2'].w)
+        # record a copy of the parameters without transfer to the CPU (i.e., no synchronization
+        # for each forward)
+        w1 = self['dataset_1'].w.detach().clone()
+        w2 = self['dataset_2'].w.detach().clone()
         self.record[dataset_name].append({'w1': w1, 'w2': w2})
 
         o = trw.train.OutputRegression(output=x_1 + x_2, target_name='output')
@@ -50,8 +52,10 @@ class PartNotTrainedModel(nn.Module):
         self.model2 = ModelSimpleRegression()
 
     def forward(self, batch):
-        # make sure model1 is not trained
-        with torch.no_grad():
+        # make sure model1 is not trained. `inference_mode` is
+        # cheaper than `no_grad` but requires pytorch >= 1.9
+        no_grad_context = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+        with no_grad_context():
             x_1 = self.model1(batch)
         x_2 = self.model2(batch)
 
@@ -59,6 +63,30 @@ class PartNotTrainedModel(nn.Module):
         return {'regression': o}
 
 
+class ModelRecordBatches(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.w = nn.Parameter(torch.zeros(1, dtype=torch.float32), requires_grad=True)
+        self.record = []
+
+    def forward(self, batch):
+        if self.training:
+            # record the parameter and the batch used to calculate the gradient
+            self.record.append((float(self.w), batch['input'].clone(), batch['output'].clone()))
+        o = trw.train.OutputRegression(output=self.w * batch['input'], target_name='output')
+        return {'regression': o}
+
+
+class OptimizerRecordGradients(torch.optim.SGD):
+    def __init__(self, params, **kwargs):
+        super().__init__(params, **kwargs)
+        self.gradients = []
+
+    def step(self, closure=None):
+        self.gradients.append(float(self.param_groups[0]['params'][0].grad))
+        return super().step(closure)
+
+
 def create_regression_double_dataset():
     """
     Create a simple dataset where output = input_1 * 2.0
@@ -140,8 +168,8 @@ class TestTrainerAdvanced(TestCase):
         dataset_size = 5
         for n in range(2, len(r_1) // dataset_size - 1):
             for nn in range(dataset_size):
-                assert r_1[n * dataset_size]['w2'] == r_1[nn + n * dataset_size]['w2']
-                assert r_2[n * dataset_size]['w1'] == r_2[nn + n * dataset_size]['w1']
+                assert (r_1[n * dataset_size]['w2'] == r_1[nn + n * dataset_size]['w2']).all()
+                assert (r_2[n * dataset_size]['w1'] == r_2[nn + n * dataset_size]['w1']).all()
 
         # make sure we can save a model
         path = os.path.join(utils.root_output, 'model_pytorch.pkl')
@@ -186,4 +214,55 @@ class TestTrainerAdvanced(TestCase):
 
         # we expect `model1` to not be trained (w=0)
         w_1 = trw.utils.to_value(final_model.model1.w)[0]
-        assert abs(w_1) < 1e-5
\ No newline at end of file
+        assert abs(w_1) < 1e-5
+
+    def test_gradient_accumulation(self):
+        nb_epochs = 3
+        options = trw.train.create_default_options(num_epochs=nb_epochs)
+        options['training_parameters']['gradient_accumulation_steps'] = 3
+        trainer = trw.train.Trainer(
+            callbacks_pre_training_fn=None,
+            callbacks_per_epoch_fn=None,
+            callbacks_per_batch_loss_terms_fn=None,
+            callbacks_post_training_fn=None,
+            callbacks_per_batch_fn=None
+        )
+
+        model = ModelRecordBatches()
+        optimizers = {}
+
+        def optimizers_fn(datasets, model):
+            optimizer = OptimizerRecordGradients(model.parameters(), lr=0.01)
+            optimizers['dataset_1'] = optimizer
+            return optimizers, None
+
+        trainer.fit(
+            options,
+            inputs_fn=create_regression_single,
+            model_fn=lambda options: model,
+            optimizers_fn=optimizers_fn)
+
+        # 5 batches of 1 sample per epoch accumulated 3 by 3: 1 step + 1 step
+        # for the 2 remaining batches at the end of the epoch
+        gradients = optimizers['dataset_1'].gradients
+        assert len(model.record) == 5 * nb_epochs
+        assert len(gradients) == 2 * nb_epochs
+
+        # the gradients of the accumulated batches are averaged, including
+        # the incomplete accumulation at the end of the epoch
+        batch_gradients = [float(2 * x * (w * x - y)) for w, x, y in model.record]
+        expected_gradients = []
+        for epoch in range(nb_epochs):
+            epoch_gradients = batch_gradients[epoch * 5:(epoch + 1) * 5]
+            for start in range(0, 5, 3):
+                accumulated_gradients = epoch_gradients[start:start + 3]
+                expected_gradients.append(sum(accumulated_gradients) / len(accumulated_gradients))
+
+        # parameters are only updated by the optimizer steps
+        for epoch in range(nb_epochs):
+            w = [record[0] for record in model.record[epoch * 5:(epoch + 1) * 5]]
+            assert w[0] == w[1] == w[2] and w[3] == w[4]
+            assert w[2] != w[3]
+
+        for gradient, expected_gradient in zip(gradients, expected_gradients):
+            self.assertAlmostEqual(gradient, expected_gradient, places=4)
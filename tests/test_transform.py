@@ -26,6 +26,14 @@ class TestTransform(TestCase):
         assert (d_transformed[1] == [9, 9, 5, 9, 9]).all()
         assert (d_transformed[2] == [9, 9, 6, 9, 9]).all()
 
+    def test_batch_pad_minmax_constant_numpy(self):
+        d = np.arange(2 * 3 * 4, dtype=np.float32).reshape((2, 3, 4))
+        d_transformed = trw.utils.batch_pad_minmax_numpy(d, [1, 0], [2, 3], mode='constant', constant_value=-1)
+        d_expected = np.pad(d, [(0, 0), (1, 2), (0, 3)], mode='constant', constant_values=-1)
+        assert d_transformed.dtype == d.dtype
+        assert d_transformed.shape == (2, 6, 7)
+        assert (d_transformed == d_expected).all()
+
     def test_batch_pad_symmetric_numpy(self):
         d = np.asarray([[10, 11, 12], [20, 21, 22], [30, 31, 32]], dtype=int)
         d_transformed = trw.utils.batch_pad_numpy(d, [2], mode='symmetric')
@@ -41,6 +49,11 @@ class TestTransform(TestCase):
         d_transformed = d_transformed.data.numpy()
         self.assertTrue(d_transformed.shape == (2, 1, 7, 9))
 
+    def test_batch_pad_edge_torch_component_padding(self):
+        d = torch.zeros([2, 1, 3, 3], dtype=torch.float32)
+        with self.assertRaises(AssertionError):
+            trw.utils.batch_pad_torch(d, [1, 2, 3], mode='edge')
+
     def test_batch_pad_replicate_numpy(self):
         i1 = [[10, 11, 12], [20, 21, 22], [30, 31, 32]]
         i2 = [[40, 41, 42], [50, 51, 52], [60, 61, 62]]
@@ -443,6 +456,33 @@ class TestTransform(TestCase):
         assert c.shape == (16, 2, 4, 8)
         assert (c == i[:, 10:12, 11:15, 12:20]).all()
 
+    def test_random_crop_4d_kernel_and_gather(self):
+        from unittest import mock
+        from trw.transforms import crop
+
+        crop_shape = [3, 10, 12]
+        for dtype in (np.float32, np.float16):
+            i = np.random.rand(8, 3, 16, 20).astype(dtype)
+            offsets = crop.transform_batch_random_crop_offset(i, crop_shape)
+            expected = np.stack([s[:, o1:o1 + 10, o2:o2 + 12] for s, (_, o1, o2) in zip(i, offsets)])
+
+            c = crop._crop_gather(i, crop_shape, offsets)
+            assert np.array_equal(c, expected)
+
+            c = trw.transforms.transform_batch_random_crop(i, crop_shape, offsets=offsets)
+            assert c.dtype == dtype
+            assert np.array_equal(c, expected)
+
+            if crop.numba_kernel_supports(dtype):
+                c = crop._crop_4d_numba(i, crop_shape, offsets)
+                assert np.array_equal(c, expected)
+
+                # the kernel can't be compiled or loaded: fall back on the gather crop
+                with mock.patch.object(crop, '_crop_4d_kernel', side_effect=NotImplementedError(str(dtype))):
+                    with self.assertWarns(UserWarning):
+                        c = trw.transforms.transform_batch_random_crop(i, crop_shape, offsets=offsets)
+                assert np.array_equal(c, expected)
+
     def test_cast_numpy(self):
         batch = {
             'float': np.zeros([10], dtype=np.long),
@@ -480,3 +520,94 @@ class TestTransform(TestCase):
         assert batch_tfm['float'].dtype == torch.float32
         assert batch_tfm['long'].dtype == torch.long
         assert batch_tfm['byte'].dtype == torch.int8
+
+    def test_cutout_crop_pad_flip_numpy(self):
+        batch = {
+            'images': np.ones([50, 3, 32, 32], dtype=np.float32),
+            'targets': np.arange(50)
+        }
+        transformer = trw.transforms.TransformRandomCutoutCropPadFlip(
+            cutout_size=(3, 8, 8), padding=(0, 4, 4), flip_axis=3)
+        transformed_batch = transformer(batch)
+        assert np.min(batch['images']) == 1, 'original image was modified!'
+        assert transformed_batch['images'].shape == (50, 3, 32, 32)
+        assert transformed_batch['targets'] is batch['targets']
+        # the cutout may be cropped or replicated by the edge padding so the
+        # number of occluded voxels varies by sample
+        assert np.min(transformed_batch['images']) == 0, 'transformed image was NOT modified!'
+
+    def test_cutout_crop_pad_flip_same_as_sequential(self):
+        from trw.transforms import transforms_random_cutout_crop_pad_flip as tfm
+
+        np.random.seed(0)
+        images = np.random.rand(20, 3, 16, 12).astype(np.float32)
+        cutout_size = (2, 5, 4)
+        padding = (0, 3, 2)
+        cutout_min, crop_offsets, flips = tfm._random_parameters(images.shape, cutout_size, padding, 3, 0.5)
+
+        # apply successively the cutout, crop, edge padding and flip
+        expected = []
+        for n, image in enumerate(images):
+            image = image.copy()
+            c = cutout_min[n]
+            image[c[0]:c[0] + cutout_size[0], c[1]:c[1] + cutout_size[1], c[2]:c[2] + cutout_size[2]] = 0
+            o = crop_offsets[n]
+            s = [size - 2 * p for size, p in zip(image.shape, padding)]
+            image = image[o[0]:o[0] + s[0], o[1]:o[1] + s[1], o[2]:o[2] + s[2]]
+            image = np.pad(image, [(p, p) for p in padding], mode='edge')
+            if flips[n, 2]:
+                image = np.flip(image, axis=2)
+            expected.append(image)
+        expected = np.stack(expected)
+
+        args = cutout_min, np.asarray(cutout_size), crop_offsets, np.asarray(padding), flips
+        output = tfm._cutout_crop_pad_flip_gather(images, *args)
+        assert np.array_equal(output, expected)
+
+        output = tfm._cutout_crop_pad_flip_gather(torch.from_numpy(images), *args)
+        assert np.array_equal(output.numpy(), expected)
+
+        if tfm._cutout_crop_pad_flip_4d_kernel is not None:
+            output = np.empty_like(images)
+            tfm._cutout_crop_pad_flip_4d_kernel(images, *args, output)
+            assert np.array_equal(output, expected)
+
+    def test_cutout_crop_pad_flip_kernel_types(self):
+        from unittest import mock
+        from trw.transforms import transforms_random_cutout_crop_pad_flip as tfm
+
+        np.random.seed(0)
+        images = np.random.rand(20, 3, 16, 12)
+        cutout_size = (2, 5, 4)
+        padding = (0, 3, 2)
+        parameters = tfm._random_parameters(images.shape, cutout_size, padding, 3, 0.5)
+        cutout_min, crop_offsets, flips = parameters
+        args = cutout_min, np.asarray(cutout_size), crop_offsets, np.asarray(padding), flips
+
+        arrays = [
+            images.astype(np.float32),
+            images.astype(np.float16),
+            torch.from_numpy(images).float(),
+            torch.from_numpy(images).float().requires_grad_(),
+            torch.from_numpy(images).bfloat16(),
+        ]
+
+        with mock.patch.object(tfm, '_random_parameters', return_value=parameters):
+            for array in arrays:
+                output = tfm.transform_batch_random_cutout_crop_pad_flip(
+                    array, cutout_size=cutout_size, padding=padding, flip_axis=3)
+                assert type(output) == type(array)
+                assert output.dtype == array.dtype
+                expected = tfm._cutout_crop_pad_flip_gather(array, *args)
+                if isinstance(output, torch.Tensor):
+                    assert torch.equal(output, expected)
+                else:
+                    assert np.array_equal(output, expected)
+
+            if tfm._cutout_crop_pad_flip_4d_kernel is not None:
+                # the kernel can't be compiled or loaded: fall back on the gather
+                with mock.patch.object(tfm, '_cutout_crop_pad_flip_4d_kernel', side_effect=NotImplementedError()):
+                    with self.assertWarns(UserWarning):
+                        output = tfm.transform_batch_random_cutout_crop_pad_flip(
+                            arrays[0], cutout_size=cutout_size, padding=padding, flip_axis=3)
+                assert np.array_equal(output, tfm._cutout_crop_pad_flip_gather(arrays[0], *args))
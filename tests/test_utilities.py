@@ -16,9 +16,15 @@ class Cnn(nn.Module):
         self.fc1 = nn.Linear(500, 400)
         self.fc2 = nn.Linear(400, 10)
 
+        # the images are expected in range [0..255]: rather than normalizing the input
+        # on each forward, fold the `1 / 255` scaling in the `conv1` weights (the
+        # bias is not affected since conv1(x / 255) = (W / 255) * x + b)
+        with torch.no_grad():
+            self.conv1.weight.mul_(1.0 / 255.0)
+
     def forward(self, batch):
         # a batch should be a dictionary of features
-        x = batch['images'] / 255.0
+        x = batch['images']
 
         x = F.relu(self.conv1(x))
         x = F.relu(self.conv2(x))
@@ -145,6 +151,10 @@ class TestUtilities(TestCase):
         assert flattened_d['key1'] == 'v1'
         assert flattened_d['key2-key3'] == 'v2'
         assert flattened_d['key4-key5-key6'] == 'v3'
+        assert list(flattened_d.keys()) == ['key1', 'key2-key3', 'key4-key5-key6']
+
+        flattened_d = trw.utils.flatten_nested_dictionaries(d, delimiter='/')
+        assert flattened_d['key4/key5/key6'] == 'v3'
 
     def test_clamp_n(self):
         t = torch.LongTensor([[1, 2, 3], [4, 5, 6]])
@@ -164,8 +174,22 @@ class TestUtilities(TestCase):
         assert len(anchors) == len(targets)
 
         targets = np.asarray(targets)
-        assert (targets[anchors] == targets[positives]).all()
-        assert np.max(targets[anchors] == targets[negatives]) == 0
+        assert np.array_equal(targets[anchors], targets[positives])
+        assert not np.any(targets[anchors] == targets[negatives])
+
+    def test_triplets_large(self):
+        targets = torch.randint(0, 10, [1000])
+
+        anchors, positives, negatives = trw.train.make_triplet_indices(targets)
+        assert len(anchors) == len(targets)
+
+        # every sample must be used once as anchor and once as positive
+        assert (np.sort(anchors) == np.arange(len(targets))).all()
+        assert (np.sort(positives) == np.arange(len(targets))).all()
+
+        targets = targets.numpy()
+        assert np.array_equal(targets[anchors], targets[positives])
+        assert not np.any(targets[anchors] == targets[negatives])
 
     def test_pairs(self):
         targets = [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 4, 4, 5, 5, 5]
@@ -257,10 +281,10 @@ class TestUtilities(TestCase):
             'images': torch.full([100, 1, 28, 28], 1000, dtype=torch.float32),
             'targets': torch.full([100], 1, dtype=torch.long),
         }
-        trw.train.apply_gradient_clipping(model, 0.01)
         output = model(batch)
         loss_terms = output['softmax'].evaluate_batch(batch, is_training=True)
         loss_terms['loss'].backward()
+        trw.train.apply_gradient_clipping(model, 0.01)
 
         assert model.fc1.weight.grad.max() <= 0.01
         assert model.fc2.weight.grad.max() <= 0.01
@@ -289,3 +313,42 @@ class TestUtilities(TestCase):
         except Exception:
             exception_raised = True
         assert exception_raised
+
+        # the failed import is cached
+        assert trw.utils.optional_import('module.doesnot.exist') is m
+        trw.utils.optional_import.cache_clear()
+        assert trw.utils.optional_import('module.doesnot.exist') is not m
+
+    def test_prefetch_batches_to_device(self):
+        device = torch.device('cuda:0') if torch.cuda.is_available() else torch.device('cpu')
+        batches = [{'values': np.full([5, 2], i, dtype=np.float32), 'name': 'batch_{}'.format(i)} for i in range(4)]
+
+        device_batches = list(trw.train.utilities.prefetch_batches_to_device(batches, device))
+        assert len(device_batches) == len(batches)
+        for i, batch in enumerate(device_batches):
+            assert batch['name'] == 'batch_{}'.format(i)
+            assert isinstance(batch['values'], torch.Tensor)
+            assert batch['values'].device.type == device.type
+            assert (batch['values'] == i).all()
+
+        assert len(list(trw.train.utilities.prefetch_batches_to_device([], device))) == 0
+
+        # the device may be specified as a string
+        device_batches = list(trw.train.utilities.prefetch_batches_to_device(batches, str(device)))
+        assert len(device_batches) == len(batches)
+
+    def test_prefetch_batches_to_device_reuse_batch_buffers(self):
+        device = torch.device('cuda:0') if torch.cuda.is_available() else torch.device('cpu')
+        nb_samples = 23
+        split = {'values': np.arange(nb_samples, dtype=np.float32)}
+        sequence = trw.train.SequenceArray(
+            split, sampler=trw.train.SamplerSequential(batch_size=5), reuse_batch_buffers=True)
+
+        # the batches are created in the same memory: the current batch must not be
+        # overwritten by the prefetching of the next batch
+        nb_batches = 0
+        for batch_id, batch in enumerate(trw.train.utilities.prefetch_batches_to_device(sequence, device)):
+            expected = np.arange(batch_id * 5, min(batch_id * 5 + 5, nb_samples))
+            assert (batch['values'].cpu().numpy() == expected).all()
+            nb_batches += 1
+        assert nb_batches == 5
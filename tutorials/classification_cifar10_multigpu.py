@@ -1,9 +1,22 @@
+import os
+
+# opt in the cuDNN v8 API which has faster depthwise convolution kernels (in particular
+# for float16 and channels_last inputs). This MUST be set before `torch` is imported
+os.environ.setdefault('TORCH_CUDNN_V8_API_ENABLED', '1')
+
 import trw
 import numpy as np
 
 import torch
+import torch.distributed
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.parallel import DistributedDataParallel
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+# the input shapes are fixed
+trw.train.enable_cudnn_benchmark_and_tf32()
 
 
 class Block(nn.Module):
@@ -32,20 +45,47 @@ class Block(nn.Module):
                 nn.BatchNorm2d(out_planes),
             )
 
-        # SE layers
-        self.fc1 = nn.Conv2d(out_planes, out_planes//16, kernel_size=1)
-        self.fc2 = nn.Conv2d(out_planes//16, out_planes, kernel_size=1)
+        # SE layers, applied on the squeezed (N, C) features
+        self.fc1 = nn.Linear(out_planes, out_planes//16)
+        self.fc2 = nn.Linear(out_planes//16, out_planes)
+
+        # convolutions with the batch norm folded in, only used in eval mode. Stored
+        # in a tuple so that they are not registered as sub-modules
+        self._fused_convs = None
+
+    def train(self, mode=True):
+        super(Block, self).train(mode)
+        if mode:
+            self._fused_convs = None
+        else:
+            # in eval mode, the batch norm is a fixed affine transform using the running
+            # statistics: fold it into the preceding convolution to save the batch norm kernels
+            with torch.no_grad():
+                self._fused_convs = (
+                    fuse_conv_bn_eval(self.conv1, self.bn1),
+                    fuse_conv_bn_eval(self.conv2, self.bn2),
+                    fuse_conv_bn_eval(self.conv3, self.bn3),
+                )
+        return self
 
     def forward(self, x):
-        out = F.relu(self.bn1(self.conv1(x)))
-        out = F.relu(self.bn2(self.conv2(out)))
-        out = self.bn3(self.conv3(out))
+        if self._fused_convs is not None:
+            conv1, conv2, conv3 = self._fused_convs
+            out = F.relu(conv1(x))
+            out = F.relu(conv2(out))
+            out = conv3(out)
+        else:
+            out = F.relu(self.bn1(self.conv1(x)))
+            out = F.relu(self.bn2(self.conv2(out)))
+            out = self.bn3(self.conv3(out))
         shortcut = self.shortcut(x) if self.stride == 1 else out
         # Squeeze-Excitation
-        w = F.avg_pool2d(out, out.size(2))
+        w = out.mean(dim=(2, 3))
         w = F.relu(self.fc1(w))
         w = self.fc2(w).sigmoid()
-        out = out * w + shortcut
+        w = w.view(w.shape[0], w.shape[1], 1, 1)
+        # single fused kernel for `out * w + shortcut`
+        out = torch.addcmul(shortcut, out, w)
         return out
 
 
@@ -71,7 +111,9 @@ class EfficientNet(nn.Module):
     def forward(self, x):
         out = F.relu(self.bn1(self.conv1(x)))
         out = self.layers(out)
-        out = out.view(out.size(0), -1)
+        # pool to 1x1 so that the classifier is independent of the input resolution
+        out = F.adaptive_avg_pool2d(out, 1)
+        out = torch.flatten(out, 1)
         out = self.linear(out)
         return out
 
@@ -89,13 +131,19 @@ def EfficientNetB0():
 
 
 class Net(nn.Module):
-    def __init__(self):
+    def __init__(self, mean, std):
         super().__init__()
         self.net = EfficientNetB0()
 
+        # the intensity normalization is done on the device rather than by the data augmentation workers
+        self.register_buffer('mean', torch.as_tensor(mean, dtype=torch.float32).view(1, 3, 1, 1))
+        self.register_buffer('std', torch.as_tensor(std, dtype=torch.float32).view(1, 3, 1, 1))
+
     def forward(self, batch):
-        # a batch should be a dictionary of features
-        x = batch['images']
+        # a batch should be a dictionary of features. Use the NHWC memory layout
+        # which is the fastest for the mixed precision convolutions
+        x = batch['images'].contiguous(memory_format=torch.channels_last)
+        x = (x - self.mean) / self.std
         x = self.net(x)
 
         return {
@@ -103,39 +151,75 @@ class Net(nn.Module):
         }
 
 
-def create_model(options):
-    model = Net()
-    model = trw.train.DataParallelExtended(model)
+def create_model(options, mean, std):
+    # one process per GPU: the gradients are all-reduced between the processes during the backward pass
+    local_rank = int(os.environ['LOCAL_RANK'])
+    model = Net(mean=mean, std=std).to(local_rank, memory_format=torch.channels_last)
+    model = DistributedDataParallel(model, device_ids=[local_rank])
     return model
 
 
 if __name__ == '__main__':
+    # this tutorial must be started with one process per GPU, e.g.:
+    #   torchrun --nproc_per_node=2 classification_cifar10_multigpu.py
+    torch.distributed.init_process_group(backend='nccl')
+    world_size = torch.distributed.get_world_size()
+    rank = torch.distributed.get_rank()
+    local_rank = int(os.environ['LOCAL_RANK'])
+    assert world_size >= 2, 'not enough processes for this multi-GPU tutorial!'
+    torch.cuda.set_device(local_rank)
+
+    # each process samples the whole dataset, so an epoch processes `world_size` times the dataset.
+    # Keep the same global batch size and number of samples seen during the training. Large batches
+    # are used to keep the GPUs busy; a batch is assembled from sub-batches augmented by the workers
+    nb_sub_batches = 16
+    batch_size = 2048 // world_size // nb_sub_batches * nb_sub_batches
+    num_epochs = 600 // world_size
+
     # configure and run the training/evaluation
-    assert torch.cuda.device_count() >= 2, 'not enough CUDA devices for this multi-GPU tutorial!'
-    options = trw.train.create_default_options(num_epochs=600)
-    trainer = trw.train.Trainer(callbacks_post_training_fn=None)
+    options = trw.train.create_default_options(num_epochs=num_epochs, device=torch.device('cuda', local_rank))
+    options['training_parameters']['mixed_precision'] = torch.float16
+    options['workflow_options']['trainer_run'] = rank
+    # compile the model to fuse the point-wise operations (e.g., the squeeze-excitation branches)
+    options['workflow_options']['compile_model'] = True
+
+    if rank == 0:
+        # the pre-training callbacks run forward passes outside the synchronized
+        # training loop so they are not used here
+        trainer = trw.train.Trainer(callbacks_pre_training_fn=None, callbacks_post_training_fn=None)
+    else:
+        # reporting is only done by the first process
+        trainer = trw.train.Trainer(
+            callbacks_pre_training_fn=None,
+            callbacks_per_epoch_fn=None,
+            callbacks_post_training_fn=None)
+
+    # the data augmentation is run by worker processes (the CPU cores are shared by the processes of the GPUs)
+    nb_workers = max(1, min((os.cpu_count() - 2) // world_size, 8))
 
     mean = np.asarray([0.485, 0.456, 0.406], dtype=np.float32)
     std = np.asarray([0.229, 0.224, 0.225], dtype=np.float32)
 
+    # cutout, pad & crop and flip the images in a single compiled pass
     transform_train = [
-        trw.transforms.TransformRandomCutout(cutout_size=(3, 16, 16)),
-        trw.transforms.TransformRandomCropPad(padding=[0, 4, 4]),
-        trw.transforms.TransformRandomFlip(axis=3),
-        trw.transforms.TransformNormalizeIntensity(mean=mean, std=std)
+        trw.transforms.TransformRandomCutoutCropPadFlip(cutout_size=(3, 16, 16), padding=(0, 4, 4), flip_axis=3),
     ]
 
-    transform_valid = [
-        trw.transforms.TransformNormalizeIntensity(mean=mean, std=std)
-    ]
+    # the images are normalized by the model (`Net.forward`): no CPU pre-processing for the validation
+    transform_valid = None
 
     model, results = trainer.fit(
         options,
         inputs_fn=lambda: trw.datasets.create_cifar10_dataset(transform_train=transform_train,
-                                                              transform_valid=transform_valid, nb_workers=0,
-                                                              batch_size=400, data_processing_batch_size=None),
+                                                              transform_valid=transform_valid, nb_workers=nb_workers,
+                                                              batch_size=batch_size,
+                                                              data_processing_batch_size=batch_size // nb_sub_batches,
+                                                              pin_memory=True),
         run_prefix='cifar10_resnet50_multigpu',
-        model_fn=create_model,
-        optimizers_fn=lambda datasets, model: trw.train.create_sgd_optimizers_scheduler_step_lr_fn(
-            datasets=datasets, model=model, learning_rate=0.1, momentum=0.9, weight_decay=5e-4, step_size=100,
-            gamma=0.3))
+        model_fn=lambda options: create_model(options, mean=mean, std=std),
+        # learning rate scaled linearly with the batch size, with warmup then cosine annealing
+        optimizers_fn=lambda datasets, model: trw.train.create_sgd_optimizers_scheduler_one_cycle_lr_fn(
+            datasets=datasets, model=model, learning_rate=0.5, momentum=0.9, weight_decay=5e-4,
+            nb_epochs=num_epochs))
+
+    torch.distributed.destroy_process_group()
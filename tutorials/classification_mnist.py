@@ -1,11 +1,15 @@
 import trw
+import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-import trw.utils
 from trw.train.outputs_trw import OutputClassification2
 
 
+# the input shapes are fixed
+trw.train.enable_cudnn_benchmark_and_tf32()
+
+
 class Net(nn.Module):
     """
     Defines our model for MNIST
@@ -22,7 +26,7 @@ class Net(nn.Module):
 
         x = F.relu(self.conv1(x))
         x = F.max_pool2d(x, 2, 2)
-        x = trw.utils.flatten(x)
+        x = x.reshape(x.size(0), -1)
         x = F.relu(self.fc1(x))
         x = self.fc2(x)
 
@@ -35,6 +39,11 @@ class Net(nn.Module):
 
 # configure and run the training/evaluation
 options = trw.train.create_default_options(num_epochs=40)
+# `float16` gradients are only scaled on GPU: use `bfloat16` on CPU
+device = options['workflow_options']['device']
+options['training_parameters']['mixed_precision'] = torch.float16 if device.type == 'cuda' else torch.bfloat16
+# the model is tiny: fuse its layers into a few autotuned kernels to limit the kernel launch overhead
+options['workflow_options']['compile_model'] = 'max-autotune'
 trainer = trw.train.Trainer()
 
 model, results = trainer.fit(
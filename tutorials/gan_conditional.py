@@ -4,11 +4,12 @@ import trw.train
 import trw.datasets
 import torch
 import torch.nn as nn
+from torch.nn.functional import one_hot as one_hot_f
 import functools
 
 from trw.layers.gan import Gan
 from trw.train import OutputEmbedding, OutputLoss
-from trw.train.losses import one_hot, LossMsePacked
+from trw.train.losses import LossMsePacked
 from trw.train.outputs_trw import OutputClassification2
 
 
@@ -35,7 +36,7 @@ class Generator(nn.Module):
         assert len(digits.shape) == 1
 
         # introduce the target as one hot encoding input to the generator
-        digits_one_hot = one_hot(digits, self.nb_digits).unsqueeze(2).unsqueeze(3)
+        digits_one_hot = one_hot_f(digits, self.nb_digits).to(latent.dtype).unsqueeze(2).unsqueeze(3)
         latent = latent.unsqueeze(2).unsqueeze(3)
 
         full_latent = torch.cat((digits_one_hot, latent), dim=1)
@@ -68,7 +69,7 @@ class Discriminator(nn.Module):
         # introduce the target as one hot encoding input to the discriminator
         input_class = torch.ones(
             [image.shape[0], self.nb_digits, image.shape[2], image.shape[3]],
-            device=image.device) * one_hot(digits, 10).unsqueeze(2).unsqueeze(3)
+            device=image.device) * one_hot_f(digits, 10).to(image.dtype).unsqueeze(2).unsqueeze(3)
         o = self.convs(torch.cat((image, input_class), dim=1))
         o_expected = int(is_real) * torch.ones(len(image), device=image.device, dtype=torch.long)
 
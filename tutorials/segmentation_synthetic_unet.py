@@ -1,20 +1,34 @@
 import trw
+import torch
 import torch.nn as nn
 
 
+# the input shapes are fixed
+trw.train.enable_cudnn_benchmark_and_tf32()
+
+
 class Net(nn.Module):
-    def __init__(self):
+    def __init__(self, gradient_checkpointing=False):
         super(Net, self).__init__()
-        self.unet = trw.layers.UNetBase(2, input_channels=3, output_channels=2, channels=[4, 8, 16])
+        # with `gradient_checkpointing`, the encoder activations are recalculated during the
+        # backward pass: more computations but less memory (e.g., to train with larger batches)
+        self.unet = trw.layers.UNetBase(2, input_channels=3, output_channels=2, channels=[4, 8, 16],
+                                        gradient_checkpointing=gradient_checkpointing)
 
     def forward(self, batch):
-        x = self.unet(batch['image'])
+        # NHWC memory layout: the fastest for the mixed precision convolutions
+        x = self.unet(batch['image'].contiguous(memory_format=torch.channels_last))
 
-        return {
+        outputs = {
             'segmentation': trw.train.OutputSegmentation2(output=x, output_truth=batch['mask']),
-            'segmentation_output': trw.train.OutputEmbedding(x.argmax(dim=1, keepdim=True))
         }
 
+        if not self.training:
+            # the segmentation map is only used for the reporting (run in eval mode) and the
+            # class indices are small: do not calculate it during the training steps
+            outputs['segmentation_output'] = trw.train.OutputEmbedding(x.argmax(dim=1, keepdim=True).to(torch.int16))
+        return outputs
+
 
 def per_epoch_callbacks():
     return [
@@ -23,11 +37,19 @@ def per_epoch_callbacks():
     ]
 
 
+# bfloat16 mixed precision: same range as float32 so no loss scaling is required
+options = trw.train.create_default_options(num_epochs=15)
+options['training_parameters']['mixed_precision'] = torch.bfloat16
+
 trainer = trw.train.Trainer(callbacks_per_epoch_fn=per_epoch_callbacks)
 
 model, results = trainer.fit(
-    trw.train.create_default_options(num_epochs=15),
-    inputs_fn=lambda: trw.datasets.create_fake_symbols_2d_dataset(nb_samples=1000, image_shape=[256, 256], nb_classes_at_once=1, batch_size=50),
+    options,
+    # the synthetic dataset is generated once and fits in the GPU memory: sample the batches on the GPU
+    inputs_fn=lambda: trw.datasets.create_fake_symbols_2d_dataset(
+        nb_samples=1000, image_shape=[256, 256], nb_classes_at_once=1, batch_size=128,
+        device=options['workflow_options']['device']),
     run_prefix='synthetic_segmentation_unet',
-    model_fn=lambda options: Net(),
-    optimizers_fn=lambda datasets, model: trw.train.create_sgd_optimizers_scheduler_step_lr_fn(datasets=datasets, model=model, learning_rate=0.05, step_size=50, gamma=0.3))
+    model_fn=lambda options: Net().to(memory_format=torch.channels_last),
+    # the learning rate is scaled linearly with the batch size
+    optimizers_fn=lambda datasets, model: trw.train.create_sgd_optimizers_scheduler_step_lr_fn(datasets=datasets, model=model, learning_rate=0.125, step_size=50, gamma=0.3))